@@ -0,0 +1,131 @@
+# this file combines DFAs (like the ones from mdfa.minimize_dfa) into one DFA
+# using the product construction, so filters like "matches A but not B" or
+# "matches all of these" run as a single DFA in one pass over the input
+
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+from nfa import State
+from dfa import DFAClean, char_transitions
+from mdfa import minimize_dfa
+
+# a missing transition goes to the (implicit) dead state
+__DEAD = None
+
+
+def __product(
+    first: DFAClean,
+    second: DFAClean,
+    accepts: Callable[[bool, bool], bool],
+    keep: Callable[[State | None, State | None], bool],
+) -> DFAClean:
+    """
+    Builds the product of the two DFAs on the fly, only the pairs of states
+    reachable from the pair of starting states are explored.
+
+    Args:
+        accepts: tells whether a pair is accepting given whether each of its states is accepting.
+        keep: tells whether a pair is worth exploring, the pairs that can never accept
+        (e.g a dead state in an intersection) are dropped right away.
+    """
+    first_maps = char_transitions(first)
+    second_maps = char_transitions(second)
+    first_accepting = set(first.accepting_states)
+    second_accepting = set(second.accepting_states)
+    alphabet = sorted(
+        {char for char_map in first_maps.values() for char in char_map}
+        | {char for char_map in second_maps.values() for char in char_map}
+    )
+
+    start_pair = (first.starting_state, second.starting_state)
+    pair_states: Dict[Tuple[State | None, State | None], State] = {start_pair: State("S0")}
+    pairs_to_process = [start_pair]
+    transitions: Dict[State, Set[Tuple[State, str]]] = {}
+    accepting_states: List[State] = []
+
+    while pairs_to_process:
+        pair = pairs_to_process.pop()
+        state = pair_states[pair]
+        if accepts(pair[0] in first_accepting, pair[1] in second_accepting):
+            accepting_states.append(state)
+        first_map = first_maps.get(pair[0], {}) if pair[0] is not __DEAD else {}
+        second_map = second_maps.get(pair[1], {}) if pair[1] is not __DEAD else {}
+        for char in alphabet:
+            next_pair = (first_map.get(char, __DEAD), second_map.get(char, __DEAD))
+            if (next_pair[0] is __DEAD and next_pair[1] is __DEAD) or not keep(*next_pair):
+                continue
+            if next_pair not in pair_states:
+                pair_states[next_pair] = State(f"S{len(pair_states)}")
+                pairs_to_process.append(next_pair)
+            transitions.setdefault(state, set()).add((pair_states[next_pair], char))
+
+    product = DFAClean(pair_states[start_pair], accepting_states, transitions, set(pair_states.values()))
+    return minimize_dfa(product)
+
+
+def intersection(first: DFAClean, *others: DFAClean) -> DFAClean:
+    """
+    Returns the minimized DFA accepting the strings accepted by all of the given DFAs.
+    """
+    result = first
+    for other in others:
+        result = __product(
+            result,
+            other,
+            lambda first_accepts, second_accepts: first_accepts and second_accepts,
+            lambda first_state, second_state: first_state is not __DEAD and second_state is not __DEAD,
+        )
+    return result
+
+
+def union(first: DFAClean, *others: DFAClean) -> DFAClean:
+    """
+    Returns the minimized DFA accepting the strings accepted by any of the given DFAs.
+    """
+    result = first
+    for other in others:
+        result = __product(
+            result,
+            other,
+            lambda first_accepts, second_accepts: first_accepts or second_accepts,
+            lambda first_state, second_state: True,
+        )
+    return result
+
+
+def difference(first: DFAClean, second: DFAClean) -> DFAClean:
+    """
+    Returns the minimized DFA accepting the strings accepted by first but not by second.
+    """
+    return __product(
+        first,
+        second,
+        lambda first_accepts, second_accepts: first_accepts and not second_accepts,
+        lambda first_state, second_state: first_state is not __DEAD,
+    )
+
+
+def complement(dfa: DFAClean, alphabet: Iterable[str] | None = None) -> DFAClean:
+    """
+    Returns the minimized DFA accepting the strings over the alphabet that the given DFA rejects,
+    it's completed with a dead state first so every missing transition goes there.
+
+    Args:
+        dfa: the DFA to complement.
+        alphabet: the characters the complement is taken over, defaults to the characters of dfa,
+        strings having any other character are rejected by the complement too.
+    """
+    char_maps = char_transitions(dfa)
+    if alphabet is None:
+        alphabet = {char for char_map in char_maps.values() for char in char_map}
+    alphabet = sorted(set(alphabet))
+    dead = State(f"S{len(dfa.all_states)}")
+    while dead in dfa.all_states:
+        dead = State(dead.label + "'")
+
+    accepting_states = set(dfa.accepting_states)
+    all_states = set(dfa.all_states) | {dead}
+    transitions: Dict[State, Set[Tuple[State, str]]] = {}
+    for state in all_states:
+        char_map = char_maps.get(state, {})
+        transitions[state] = {(char_map.get(char, dead), char) for char in alphabet}
+    complemented = [state for state in all_states if state not in accepting_states]
+    return minimize_dfa(DFAClean(dfa.starting_state, complemented, transitions, all_states))
@@ -82,3 +82,16 @@ class CharacterClassAstNode(AstNode):
 
     def __repr__(self):
         return f"[{self.char_class}]"
+
+
+class GroupAstNode(AstNode):
+    # a capture group (only made by Parser(..., captures=True)), it matches what its child matches
+    def __init__(self, left: AstNode, index: int):
+        self.left = left
+        self.index = index
+
+    def __str__(self):
+        return f"(?{self.index} {self.left})"
+
+    def __repr__(self):
+        return f"(?{self.index} {self.left})"
@@ -0,0 +1,75 @@
+# this file compares recompiling an edited regex from scratch (nfa.py)
+# against the memoized fragments of fragment.py
+# usage: python ./bench_incremental.py [--alternatives N] [--edits N]
+
+import argparse
+import random
+import time
+from lexer import Lexer
+from parser import Parser
+from nfa import ast_to_nfa, get_transition_table
+from fragment import IncrementalCompiler
+
+
+def build_pattern(alternatives: int, rng: random.Random) -> str:
+    words = []
+    for _ in range(alternatives):
+        word = "".join(rng.choice("ABCDEF") for _ in range(rng.randint(3, 8)))
+        words.append(f"(({word})[0-9]*)")
+    return "(" + "|".join(words) + ")+"
+
+
+def edit_pattern(pattern: str, rng: random.Random) -> str:
+    # replace one literal by another one, so the regex stays valid
+    positions = [i for i, char in enumerate(pattern) if char in "ABCDEF"]
+    position = rng.choice(positions)
+    return pattern[:position] + rng.choice("ABCDEF") + pattern[position + 1 :]
+
+
+def run(alternatives: int, edits: int, seed: int = 0):
+    rng = random.Random(seed)
+    pattern = build_pattern(alternatives, rng)
+    patterns = [pattern]
+    for _ in range(edits):
+        patterns.append(edit_pattern(patterns[-1], rng))
+    # lexing and parsing are the same for both, so they're timed apart
+    asts = [Parser(Lexer(pattern).tokenize()).parse() for pattern in patterns]
+
+    started = time.perf_counter()
+    for pattern in patterns[1:]:
+        Parser(Lexer(pattern).tokenize()).parse()
+    parse_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for ast in asts[1:]:
+        ast_to_nfa(ast)
+        get_transition_table()
+    scratch_time = time.perf_counter() - started
+
+    compiler = IncrementalCompiler()
+    compiler.build_nfa(patterns[0])  # the warm up, the first compile can't hit the cache
+    compiler.hits = compiler.misses = 0
+    started = time.perf_counter()
+    for pattern in patterns[1:]:
+        compiler.build_nfa(pattern)
+    incremental_time = time.perf_counter() - started - parse_time
+
+    print(f"pattern length: {len(patterns[0])}, edits: {edits}")
+    print(f"lexer + parser: {parse_time / edits * 1000:.3f} ms/edit")
+    print(f"nfa from scratch: {scratch_time / edits * 1000:.3f} ms/edit")
+    print(f"nfa incremental:  {incremental_time / edits * 1000:.3f} ms/edit (hits: {compiler.hits}, misses: {compiler.misses})")
+    print(f"cached fragments: {len(compiler)} (evicted: {compiler.evictions})")
+    print(f"nfa speedup: {scratch_time / incremental_time:.2f}x")
+    print(f"end to end speedup: {(parse_time + scratch_time) / (parse_time + incremental_time):.2f}x")
+
+
+def main():
+    args = argparse.ArgumentParser(description="benchmark the incremental NFA recompilation")
+    args.add_argument("--alternatives", type=int, default=300, help="number of alternatives in the regex")
+    args.add_argument("--edits", type=int, default=200, help="number of single character edits")
+    args = args.parse_args()
+    run(args.alternatives, args.edits)
+
+
+if __name__ == "__main__":
+    main()
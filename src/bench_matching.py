@@ -0,0 +1,270 @@
+# this file measures the matching speed of every matcher backend (matcher.py, codegen.py)
+# next to python's re module, over generated matching and non-matching corpora,
+# and checks that every backend accepts / rejects exactly what re does
+# usage: python ./bench_matching.py [--size BYTES] [--backends dfa,codegen,bytes,nfa,re] [--output results.json]
+
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+from lexer import Lexer
+from parser import Parser
+from nfa import State, ast_to_nfa, get_transition_table, get_starting_state, get_accepting_state
+from dfa import char_transitions
+from compiler import compile_regex
+from matcher import DFATable, DFAMatcher, ByteDFAMatcher, NFAMatcher
+from codegen import compile_matcher
+
+BACKENDS = ["dfa", "codegen", "bytes", "nfa", "re"]
+
+
+def synthetic_patterns() -> List[Tuple[str, str]]:
+    """
+    Returns (family, regex) pairs stressing the matchers in different ways.
+    """
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "theta", "kappa"]
+    return [
+        ("literal", "(hello world)"),
+        ("alternation", "(" + "|".join(words) + ")"),
+        ("word list", "((" + "|".join(words) + ") )*"),
+        ("class run", "([a-z]+)"),
+        ("identifier", "([a-zA-Z_]([a-zA-Z0-9_]*))"),
+        ("number", "((/-)?([0-9]+)((.([0-9]+))?))"),
+        ("nested stars", "(((a|b)*)abb)"),
+        ("unicode", "([а-я]+)"),
+    ]
+
+
+def to_python_regex(input_regex: str) -> str:
+    """
+    Translates a regex of this project to re's syntax, "/" is the escape character here (see lexer.py),
+    it's always dropped, and every character that isn't a meta character is a literal, like "." or "\\".
+    """
+    translated = []
+    escaped = False
+    for char in input_regex:
+        if char == Lexer.Escape_Character:
+            escaped = True
+            continue
+        if char in Lexer.Meta_Characters_Map and not escaped:
+            translated.append(char)
+        else:
+            translated.append(re.escape(char))
+        escaped = False
+    return "".join(translated)
+
+
+def load_patterns(filename: str) -> List[Tuple[str, str]]:
+    """
+    Returns ("testcases", regex) pairs for the valid regexes of the given file, one (quoted) regex per line.
+    """
+    patterns = []
+    with open(filename, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) >= 2 and line[0] == line[-1] == '"':
+                line = line[1:-1]
+            if not line:
+                continue
+            try:
+                compile_regex(line, verbose=True)
+                re.compile(to_python_regex(line))
+            except Exception:
+                continue  # the file holds invalid regexes too
+            patterns.append(("testcases", line))
+    return patterns
+
+
+class CorpusGenerator:
+    """
+    Generates strings from the minimized DFA of a regex, matching ones by random walks
+    that head to the closest accepting state once long enough, and non-matching ones
+    by mutating the matching ones until re rejects them.
+    """
+
+    def __init__(self, input_regex: str, rng: random.Random, max_length: int = 64):
+        mdfa = compile_regex(input_regex, verbose=True)
+        self.char_maps = char_transitions(mdfa)
+        self.starting_state = mdfa.starting_state
+        self.accepting_states = set(mdfa.accepting_states)
+        self.alphabet = sorted({char for char_map in self.char_maps.values() for char in char_map})
+        self.pattern = re.compile(to_python_regex(input_regex))
+        self.rng = rng
+        self.max_length = max_length
+        # distances[state] is the length of the shortest string leading to an accepting state
+        self.distances: Dict[State, int] = {state: 0 for state in self.accepting_states}
+        changed = True
+        while changed:
+            changed = False
+            for state, char_map in self.char_maps.items():
+                for next_state in char_map.values():
+                    if next_state in self.distances and self.distances.get(state, sys.maxsize) > self.distances[next_state] + 1:
+                        self.distances[state] = self.distances[next_state] + 1
+                        changed = True
+
+    def matching(self) -> str | None:
+        if self.starting_state not in self.distances:
+            return None  # the regex matches nothing
+        chars = []
+        state = self.starting_state
+        target = self.rng.randint(0, self.max_length)
+        while True:
+            char_map = self.char_maps.get(state, {})
+            if len(chars) >= target:
+                if state in self.accepting_states:
+                    return "".join(chars)
+                # the shortest way to an accepting state
+                char_map = {char: next_state for char, next_state in char_map.items() if self.distances.get(next_state, sys.maxsize) < self.distances[state]}
+            else:
+                char_map = {char: next_state for char, next_state in char_map.items() if next_state in self.distances}
+                if not char_map:
+                    return "".join(chars)
+            char = self.rng.choice(sorted(char_map))
+            chars.append(char)
+            state = char_map[char]
+
+    def non_matching(self, tries: int = 20) -> str | None:
+        for _ in range(tries):
+            text = list(self.matching() or "")
+            operation = self.rng.randrange(3)
+            position = self.rng.randint(0, len(text))
+            if operation == 0 or not text:
+                text.insert(position, self.rng.choice(self.alphabet + ["#"]))
+            elif operation == 1:
+                text[min(position, len(text) - 1)] = self.rng.choice(self.alphabet + ["#"])
+            else:
+                del text[min(position, len(text) - 1)]
+            text = "".join(text)
+            if not self.pattern.fullmatch(text):
+                return text
+        return None
+
+    def corpus(self, size: int, matching: bool) -> List[str]:
+        """
+        Returns strings of about size bytes (UTF-8 encoded) in total, all matching or all not matching.
+        """
+        strings = []
+        total = 0
+        failures = 0
+        while total < size and failures < 100:
+            text = self.matching() if matching else self.non_matching()
+            if text is None:
+                failures += 1
+                continue
+            strings.append(text)
+            total += len(text.encode("utf-8")) or 1
+        return strings
+
+
+def build_backend(name: str, input_regex: str) -> Tuple[Callable, bool]:
+    """
+    Returns (fullmatch function, whether it takes bytes) for the named backend.
+    """
+    if name == "dfa":
+        return DFAMatcher(DFATable(compile_regex(input_regex, verbose=True))).fullmatch, False
+    if name == "codegen":
+        return compile_matcher(input_regex), False
+    if name == "bytes":
+        return ByteDFAMatcher(DFATable(compile_regex(input_regex, byte_level=True))).fullmatch, True
+    if name == "nfa":
+        ast_to_nfa(Parser(Lexer(input_regex).tokenize()).parse())
+        return NFAMatcher(get_starting_state(), get_accepting_state(), get_transition_table()).fullmatch, False
+    if name == "re":
+        pattern = re.compile(to_python_regex(input_regex))
+        return lambda text: pattern.fullmatch(text) is not None, False
+    raise Exception(f"unknown backend {name!r}, expected one of {BACKENDS}")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(fullmatch: Callable, inputs: List, expected: List[bool], size: int) -> Dict:
+    """
+    Runs fullmatch over every input, timing every call apart.
+    """
+    latencies = []
+    results = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for text in inputs:
+        call_started = clock()
+        results.append(bool(fullmatch(text)))
+        latencies.append(clock() - call_started)
+    elapsed = max(clock() - started, 1) / 1e9
+    latencies.sort()
+    matches = sum(results)
+    return {
+        "calls": len(inputs),
+        "matches": matches,
+        "disagreements": sum(result != reference for result, reference in zip(results, expected)),
+        "seconds": elapsed,
+        "mb_per_s": size / elapsed / 1e6,
+        "calls_per_s": len(inputs) / elapsed,
+        "matches_per_s": matches / elapsed,
+        "latency_us": {
+            "p50": percentile(latencies, 0.50) / 1000,
+            "p90": percentile(latencies, 0.90) / 1000,
+            "p99": percentile(latencies, 0.99) / 1000,
+            "max": latencies[-1] / 1000 if latencies else 0.0,
+        },
+    }
+
+
+def run(testcases: str, size: int, backends: List[str], seed: int = 0, output: str | None = None) -> List[Dict]:
+    rng = random.Random(seed)
+    results = []
+    for family, input_regex in load_patterns(testcases) + synthetic_patterns():
+        generator = CorpusGenerator(input_regex, rng)
+        corpora = {"matching": generator.corpus(size, True), "non-matching": generator.corpus(size, False)}
+        print(f"{family}: {input_regex}")
+        for backend in backends:
+            fullmatch, takes_bytes = build_backend(backend, input_regex)
+            for corpus_name, corpus in corpora.items():
+                encoded = [text.encode("utf-8") for text in corpus]
+                expected = [generator.pattern.fullmatch(text) is not None for text in corpus]
+                result = measure(fullmatch, encoded if takes_bytes else corpus, expected, sum(map(len, encoded)))
+                result.update({"family": family, "regex": input_regex, "backend": backend, "corpus": corpus_name})
+                results.append(result)
+                flag = "" if result["disagreements"] == 0 else f"  {result['disagreements']} DISAGREEMENTS WITH re"
+                print(
+                    f"  {backend:>8} {corpus_name:>12}: {result['mb_per_s']:8.2f} MB/s {result['matches_per_s']:10.0f} matches/s"
+                    f"  p50 {result['latency_us']['p50']:7.2f} us  p99 {result['latency_us']['p99']:8.2f} us{flag}"
+                )
+
+    if output is not None:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size": size,
+            "seed": seed,
+            "results": results,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    disagreements = sum(result["disagreements"] for result in results)
+    print(f"disagreements with re: {disagreements}")
+    return results
+
+
+def main():
+    args = argparse.ArgumentParser(description="benchmark the matchers against python's re module")
+    args.add_argument("--testcases", default="../testcases.txt", help="file of regexes, one per line")
+    args.add_argument("--size", type=int, default=64 * 1024, help="bytes of every generated corpus")
+    args.add_argument("--backends", default=",".join(BACKENDS), help="comma separated backends: " + ",".join(BACKENDS))
+    args.add_argument("--seed", type=int, default=0, help="seed of the corpus generation")
+    args.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = args.parse_args()
+    results = run(args.testcases, args.size, args.backends.split(","), args.seed, args.output)
+    sys.exit(1 if any(result["disagreements"] for result in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# this file holds the resource limits used while compiling a regex
+# (lexer -> parser -> nfa -> powerset -> minimization), so a single
+# adversarial pattern can't eat all the memory or time of the worker
+
+import time
+from typing import Dict
+
+
+class BudgetExceededError(Exception):
+    """
+    Raised when one of the limits of a CompileBudget is hit.
+
+    Attributes:
+        limit: the name of the limit that was hit (e.g "max_dfa_states").
+        maximum: the configured value of that limit.
+        value: the value that went over it.
+        phase: the compilation phase that was running ("lexer", "nfa", "powerset", "clean", "minimize").
+        stats: a copy of the partial statistics collected up to that point.
+    """
+
+    def __init__(self, limit: str, maximum: float, value: float, phase: str, stats: Dict[str, float]):
+        self.limit = limit
+        self.maximum = maximum
+        self.value = value
+        self.phase = phase
+        self.stats = stats
+        super().__init__(f"{limit} exceeded during {phase}: {value} > {maximum}")
+
+
+class CompileBudget:
+    """
+    Configurable limits checked throughout the compilation pipeline.
+
+    Args:
+        max_nfa_states: max number of NFA states.
+        max_dfa_states: max number of DFA superstates built by the powerset construction.
+        max_transitions: max number of transitions in any of the NFA or DFA.
+        deadline: max number of wall-clock seconds since start() was called.
+    Any of them can be None to leave it unbounded.
+    """
+
+    def __init__(
+        self,
+        max_nfa_states: int | None = None,
+        max_dfa_states: int | None = None,
+        max_transitions: int | None = None,
+        deadline: float | None = None,
+    ):
+        self.max_nfa_states = max_nfa_states
+        self.max_dfa_states = max_dfa_states
+        self.max_transitions = max_transitions
+        self.deadline = deadline
+        self.stats: Dict[str, float] = {}
+        self.__started = time.monotonic()
+
+    def start(self) -> None:
+        """
+        Restarts the deadline clock and clears the collected statistics.
+        """
+        self.stats = {}
+        self.__started = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.__started
+
+    def __check(self, limit: str, maximum: float | None, value: float, phase: str) -> None:
+        if maximum is not None and value > maximum:
+            self.stats["elapsed"] = self.elapsed()
+            raise BudgetExceededError(limit, maximum, value, phase, dict(self.stats))
+
+    def check_deadline(self, phase: str) -> None:
+        self.__check("deadline", self.deadline, self.elapsed(), phase)
+
+    def check_tokens(self, tokens: int) -> None:
+        self.stats["tokens"] = tokens
+        self.check_deadline("lexer")
+
+    def check_nfa(self, states: int, transitions: int) -> None:
+        self.stats["nfa_states"] = states
+        self.stats["nfa_transitions"] = transitions
+        self.__check("max_nfa_states", self.max_nfa_states, states, "nfa")
+        self.__check("max_transitions", self.max_transitions, transitions, "nfa")
+        self.check_deadline("nfa")
+
+    def check_dfa(self, states: int, transitions: int) -> None:
+        self.stats["dfa_states"] = states
+        self.stats["dfa_transitions"] = transitions
+        self.__check("max_dfa_states", self.max_dfa_states, states, "powerset")
+        self.__check("max_transitions", self.max_transitions, transitions, "powerset")
+        self.check_deadline("powerset")
+
+    def check_minimize(self, groups: int) -> None:
+        self.stats["mdfa_groups"] = groups
+        self.check_deadline("minimize")
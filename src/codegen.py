@@ -0,0 +1,197 @@
+# this file turns a (minimized) DFA into the python source of a specialized
+# matcher function, every state becomes a chain of range checks on the current
+# character instead of indexing the tables of matcher.DFAMatcher for every character,
+# only the few hottest states are checked one by one, the others look their next state up
+# in a list of per-state dicts, so the dispatch doesn't grow with the number of states
+
+import hashlib
+from typing import Callable, Dict, Iterable, List, Tuple
+from nfa import State
+from dfa import DFAClean, char_transitions, state_order
+from compiler import compile_regex
+
+# runs of at least this many consecutive characters are checked as a range
+__MIN_RANGE_CHECK = 64
+# the number of (hottest) states checked one by one, the others go through their rows
+__HOT_STATES = 4
+# a state going to more states than this looks its next state up in a dict constant
+__MAX_BRANCHES = 4
+
+# {sha256 of the regex and of the sample: the compiled function}
+__compiled_matchers: Dict[str, Callable[[str], bool]] = {}
+
+
+def __char_ranges(chars: List[str]) -> List[Tuple[str, str]]:
+    # merges the sorted chars into runs of consecutive code points
+    ranges: List[Tuple[str, str]] = []
+    for char in chars:
+        if ranges and ord(ranges[-1][1]) + 1 == ord(char):
+            ranges[-1] = (ranges[-1][0], char)
+        else:
+            ranges.append((char, char))
+    return ranges
+
+
+def __constant(value: str, constants: Dict[str, str]) -> str:
+    # the constants are {source: name}, the same value is emitted once
+    if value not in constants:
+        constants[value] = f"_C{len(constants)}"
+    return constants[value]
+
+
+def __condition(chars: List[str], constants: Dict[str, str]) -> str:
+    # long runs are checked as ranges, the other characters go into a frozenset constant
+    # since one hash lookup is cheaper than a chain of comparisons
+    singles = []
+    checks = []
+    for first, last in __char_ranges(sorted(chars)):
+        if ord(last) - ord(first) >= __MIN_RANGE_CHECK:
+            checks.append(f"{first!r} <= c <= {last!r}")
+        else:
+            singles.extend(chr(code) for code in range(ord(first), ord(last) + 1))
+    if len(singles) == 1:
+        checks.append(f"c == {singles[0]!r}")
+    elif singles:
+        name = __constant(f"frozenset({''.join(singles)!r})", constants)
+        checks.append(f"c in {name}")
+    return " or ".join(checks)
+
+
+def __count_edges(dfa: DFAClean, char_maps: Dict[State, Dict[str, State]], sample: Iterable[str]):
+    state_counts: Dict[State, int] = {}
+    edge_counts: Dict[Tuple[State, State], int] = {}
+    for text in sample:
+        state = dfa.starting_state
+        for char in text:
+            next_state = char_maps.get(state, {}).get(char)
+            if next_state is None:
+                break
+            state_counts[state] = state_counts.get(state, 0) + 1
+            edge_counts[(state, next_state)] = edge_counts.get((state, next_state), 0) + 1
+            state = next_state
+    return state_counts, edge_counts
+
+
+def __state_body(
+    lines: List[str],
+    indent: str,
+    state: State,
+    char_maps: Dict[State, Dict[str, State]],
+    edge_counts: Dict[Tuple[State, State], int],
+    state_ids: Dict[State, int],
+    constants: Dict[str, str],
+):
+    # the checks of the edges of one state, in the order of their counts then of their width
+    targets: Dict[State, List[str]] = {}
+    for char, next_state in char_maps.get(state, {}).items():
+        targets.setdefault(next_state, []).append(char)
+    if not targets:
+        lines.append(f"{indent}return False")
+        return
+    if len(targets) > __MAX_BRANCHES:
+        # one dict lookup instead of a long chain of checks
+        table = {char: state_ids[next_state] for char, next_state in sorted(char_maps[state].items())}
+        lines.append(f"{indent}state = {__constant(repr(table), constants)}.get(c, -1)")
+        lines.append(f"{indent}if state < 0:")
+        lines.append(f"{indent}    return False")
+        return
+    ordered = sorted(
+        targets.items(),
+        key=lambda item: (-edge_counts.get((state, item[0]), 0), -len(item[1]), item[0]),
+    )
+    for branch, (next_state, chars) in enumerate(ordered):
+        lines.append(f"{indent}{'if' if branch == 0 else 'elif'} {__condition(chars, constants)}:")
+        if next_state == state:
+            lines.append(f"{indent}    continue")
+        else:
+            lines.append(f"{indent}    state = {state_ids[next_state]}")
+    lines.append(f"{indent}else:")
+    lines.append(f"{indent}    return False")
+
+
+def generate_source(dfa: DFAClean, function_name: str = "fullmatch", sample: Iterable[str] | None = None) -> str:
+    """
+    Generates the source of a function `function_name(text: str) -> bool` that tells
+    whether the whole text is accepted by the given DFA, along with the constants it uses.
+
+    Args:
+        dfa: the DFA to generate, it should be built with verbose=True.
+        function_name: the name of the generated function.
+        sample: optional corpus, the states and the edges used most on it are checked first,
+        without it the edges covering more characters are checked first.
+
+    Returns:
+        the python source of the function.
+    """
+    char_maps = char_transitions(dfa)
+    state_counts, edge_counts = __count_edges(dfa, char_maps, sample or [])
+    # the hottest states are checked first, without a sample it's the ones with self loops
+    # since that's where the matcher stays the longest
+    states = sorted(
+        dfa.all_states,
+        key=lambda state: (
+            -state_counts.get(state, 0),
+            state not in char_maps.get(state, {}).values(),
+            state != dfa.starting_state,
+            state,
+        ),
+    )
+    state_ids = {state: index for index, state in enumerate(state_order(dfa))}
+    accepting = sorted(state_ids[state] for state in set(dfa.accepting_states))
+
+    constants: Dict[str, str] = {}
+    lines = [f"def {function_name}(text):", f"    state = {state_ids[dfa.starting_state]}", "    for c in text:"]
+    hot = states[:__HOT_STATES]
+    for position, state in enumerate(hot):
+        lines.append(f"        {'if' if position == 0 else 'elif'} state == {state_ids[state]}:")
+        __state_body(lines, "            ", state, char_maps, edge_counts, state_ids, constants)
+    if len(states) > len(hot):
+        # the other states look their next state up in their row, {char: next state id} by state id
+        # (the rows of the hot states are never used)
+        rows = [
+            {} if state in hot else {char: state_ids[next_state] for char, next_state in sorted(char_maps.get(state, {}).items())}
+            for state in state_order(dfa)
+        ]
+        lines.append("        else:")
+        lines.append(f"            state = {__constant(repr(rows), constants)}[state].get(c, -1)")
+        lines.append("            if state < 0:")
+        lines.append("                return False")
+    if len(accepting) == 1:
+        lines.append(f"    return state == {accepting[0]}")
+    else:
+        lines.append(f"    return state in {set(accepting) or '()'}")
+    definitions = [f"{name} = {value}" for value, name in constants.items()]
+    return "\n".join(definitions + ["", ""] + lines) + "\n"
+
+
+def compile_source(source: str, function_name: str = "fullmatch") -> Callable[[str], bool]:
+    namespace: Dict[str, object] = {}
+    exec(compile(source, f"<{function_name}>", "exec"), namespace)
+    return namespace[function_name]
+
+
+def compile_matcher(input_regex: str, sample: Iterable[str] | None = None) -> Callable[[str], bool]:
+    """
+    Compiles the regex into a plain python function telling whether a whole string matches it,
+    the functions are cached by the hash of the regex and of the sample (it changes the order of the checks).
+    """
+    sample = None if sample is None else list(sample)
+    digest = hashlib.sha256(input_regex.encode("utf-8"))
+    if sample is not None:
+        for text in sample:
+            digest.update(b"\0" + text.encode("utf-8", "surrogatepass"))
+    key = digest.hexdigest() + ("" if sample is None else "+sample")
+    if key not in __compiled_matchers:
+        mdfa = compile_regex(input_regex, verbose=True)
+        __compiled_matchers[key] = compile_source(generate_source(mdfa, sample=sample))
+    return __compiled_matchers[key]
+
+
+def write_module(input_regex: str, filename: str, function_name: str = "fullmatch", sample: Iterable[str] | None = None):
+    """
+    Writes the matcher of the regex as a python module, so importing it later costs no compilation at all.
+    """
+    mdfa = compile_regex(input_regex, verbose=True)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(f"# generated by codegen.py from the regex {input_regex!r}, don't edit it\n\n")
+        f.write(generate_source(mdfa, function_name, sample))
@@ -0,0 +1,60 @@
+# this file chains the whole pipeline (lexer -> parser -> nfa -> powerset -> minimization)
+# without any logging or visualization, so it can be used as a library
+
+from lexer import Lexer
+from parser import Parser
+from nfa import ast_to_nfa, get_transition_table, get_starting_state, get_accepting_state
+from dfa import DFAClean, build_powerset, clean_dfa
+from mdfa import minimize_dfa
+from budget import CompileBudget, BudgetExceededError
+from matcher import NFAMatcher
+from utf8 import utf8_ast
+
+
+def compile_regex(
+    input_regex: str,
+    verbose: bool = False,
+    budget: CompileBudget | None = None,
+    fallback_to_nfa: bool = False,
+    byte_level: bool = False,
+) -> DFAClean | NFAMatcher:
+    """
+    Compiles the given regex into its minimized DFA.
+
+    Args:
+        input_regex: the regex to compile.
+        verbose: expand ranges like [a-z] into one edge per character.
+        budget: optional limits checked in every phase, its clock is restarted here.
+        fallback_to_nfa: when a limit is hit after the NFA is built (i.e in the powerset
+        or the minimization), return an NFAMatcher over that NFA instead of raising.
+        byte_level: compile the UTF-8 encoding of the regex, the DFA edges are then bytes
+        (as chr(0) .. chr(255)) and it's run over raw buffers by matcher.ByteDFAMatcher,
+        ranges are always expanded in this mode.
+
+    Returns:
+        the minimized DFA, or an NFAMatcher when falling back.
+
+    Raises:
+        BudgetExceededError: when a limit is hit (and no fallback applies), its stats
+        hold the partial statistics of the phases that ran.
+    """
+    if budget is not None:
+        budget.start()
+    tokens = Lexer(input_regex, budget).tokenize()
+    ast = Parser(tokens).parse()
+    if byte_level:
+        ast = utf8_ast(ast)
+        verbose = True
+
+    ast_to_nfa(ast, verbose=verbose, budget=budget)
+    nfa = get_transition_table()
+    starting_state = get_starting_state()
+    accepting_state = get_accepting_state()
+
+    try:
+        dfa = build_powerset(starting_state, accepting_state, nfa, budget)
+        return minimize_dfa(clean_dfa(dfa, budget=budget), budget)
+    except BudgetExceededError:
+        if not fallback_to_nfa:
+            raise
+        return NFAMatcher(starting_state, accepting_state, nfa)
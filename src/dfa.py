@@ -1,8 +1,8 @@
 # this file is used to generate the DFA from the NFA
 
-from typing import Dict, List, Tuple, Set
-from nfa import State, EPSILON
-from copy import deepcopy
+from typing import Dict, Iterable, List, Tuple, Set
+from nfa import State, EPSILON, label_to_range
+from budget import CompileBudget
 
 
 class DFA:
@@ -51,14 +51,14 @@ def __get_epsilon_closure(nfa_start: State, nfa_transitions: Dict[State, List[Tu
     # 2- R can be reached via an epsilon transition from any state in the epsilon closure of S
     epsilon_closure = set()
     epsilon_closure.add(nfa_start)
-    still_adding = True
-    while still_adding:
-        still_adding = False
-        for state in deepcopy(epsilon_closure):
-            for next_state, char in nfa_transitions.get(state, []):
-                if char == EPSILON and next_state not in epsilon_closure:
-                    still_adding = True
-                    epsilon_closure.add(next_state)
+    # every state is expanded once, when it's first added to the closure
+    states_to_expand = [nfa_start]
+    while states_to_expand:
+        state = states_to_expand.pop()
+        for next_state, char in nfa_transitions.get(state, []):
+            if char == EPSILON and next_state not in epsilon_closure:
+                epsilon_closure.add(next_state)
+                states_to_expand.append(next_state)
     return epsilon_closure
 
 
@@ -66,6 +66,7 @@ def build_powerset(
     nfa_start: State,
     nfa_accepting: State,
     nfa_transitions: Dict[State, List[Tuple[State, str]]],
+    budget: CompileBudget | None = None,
 ) -> DFA:
     """
     Builds the powerset of the given NFA.
@@ -75,6 +76,8 @@ def build_powerset(
         nfa_accepting: The accepting state of the NFA.
         nfa_transitions: The transitions of the NFA. it's in the form of:
         {from_state: [(to_state, transition_symbol|ε), ...], }
+        budget: optional limits on the number of superstates, transitions and time,
+        a BudgetExceededError is raised as soon as one of them is hit.
 
     Returns:
         a DFA {starting_state, accepting_states, transitions, all_states}
@@ -86,11 +89,18 @@ def build_powerset(
     dfa_transitions: Dict[frozenset[State], Set[Tuple[frozenset[State], str]]] = {}
 
     superstates_to_process: List[Set[State]] = [dfa_start]
+    # the superstates already pushed, so one reached on many chars is processed once
+    superstates_seen: Set[frozenset[State]] = {frozenset(dfa_start)}
+    transitions_count = 0
+    # the closure of a state is the same whatever the superstate it's reached from
+    closures: Dict[State, Set[State]] = {}
 
     while superstates_to_process:
         superstate = superstates_to_process.pop()
         frozen_superstate = frozenset(superstate)
         dfa_states.add(frozen_superstate)
+        if budget is not None:
+            budget.check_dfa(len(dfa_states), transitions_count)
         if nfa_accepting in superstate:
             dfa_accept.append(frozen_superstate)
 
@@ -98,45 +108,104 @@ def build_powerset(
         for state in superstate:
             for next_state, char in nfa_transitions.get(state, []):
                 if char != EPSILON:
-                    state_moving = __get_epsilon_closure(next_state, nfa_transitions)
+                    if next_state not in closures:
+                        closures[next_state] = __get_epsilon_closure(next_state, nfa_transitions)
+                    state_moving = closures[next_state]
                     if char in superstate_transitions:
                         superstate_transitions[char] = superstate_transitions[char].union(state_moving)
                     else:
                         superstate_transitions[char] = state_moving
 
+        transitions_count += len(superstate_transitions)
         for char, next_superstate in superstate_transitions.items():
             frozen_next_superstate = frozenset(next_superstate)
             if frozen_superstate in dfa_transitions:
                 dfa_transitions[frozen_superstate].add((frozen_next_superstate, char))
             else:
                 dfa_transitions[frozen_superstate] = {(frozen_next_superstate, char)}
-            if next_superstate not in dfa_states:
+            if frozen_next_superstate not in superstates_seen:
+                superstates_seen.add(frozen_next_superstate)
                 superstates_to_process.append(next_superstate)
 
+    if budget is not None:
+        budget.check_dfa(len(dfa_states), transitions_count)
     return DFA(frozenset(dfa_start), dfa_accept, dfa_transitions, dfa_states)
 
 
-def clean_dfa(dfa: DFA) -> DFAClean:
+def __reachable_order(dfa: DFA) -> List[frozenset[State]]:
+    # BFS from the starting state following the edges in sorted label order
+    order = [dfa.starting_state]
+    seen = {dfa.starting_state}
+    for superstate in order:  # order grows while it's walked
+        for next_superstate, _ in sorted(dfa.transitions.get(superstate, ()), key=lambda transition: transition[1]):
+            if next_superstate not in seen:
+                seen.add(next_superstate)
+                order.append(next_superstate)
+    return order
+
+
+def __coaccessible(dfa: DFA, superstates: List[frozenset[State]]) -> Set[frozenset[State]]:
+    # the superstates from which an accepting superstate can be reached
+    predecessors: Dict[frozenset[State], Set[frozenset[State]]] = {}
+    for superstate in superstates:
+        for next_superstate, _ in dfa.transitions.get(superstate, ()):
+            predecessors.setdefault(next_superstate, set()).add(superstate)
+    reached = set(superstates).intersection(dfa.accepting_states)
+    superstates_to_process = list(reached)
+    while superstates_to_process:
+        for previous in predecessors.get(superstates_to_process.pop(), ()):
+            if previous not in reached:
+                reached.add(previous)
+                superstates_to_process.append(previous)
+    return reached
+
+
+def clean_dfa(
+    dfa: DFA, visit_counts: Dict[frozenset[State], int] | None = None, budget: CompileBudget | None = None
+) -> DFAClean:
     """
     Cleans the given DFA i.e exchange the supersets with just a single state representing them.
 
+    The unreachable states and the dead ones (that can't reach an accepting state) are dropped,
+    a missing transition rejects just like a dead state does. The states are numbered
+    S0, S1, ... in BFS order from the starting state (S0) following the edges in sorted label order,
+    so the same DFA is always numbered the same and the states near each other are numbered close.
+
     Args:
         dfa: The DFA to clean.
+        visit_counts: optional {superstate: visits} profile (see profile_visits), the most visited
+        states are numbered first, the BFS order breaks the ties.
+        budget: optional limits, its deadline is checked while the states are renumbered.
 
     Returns:
         A DFAClean {starting_state, accepting_states, transitions, all_states}
     """
-    index = 0
+    if budget is not None:
+        budget.check_deadline("clean")
+    reachable = __reachable_order(dfa)
+    if budget is not None:
+        budget.check_deadline("clean")
+    alive = __coaccessible(dfa, reachable)
+    # the starting state is kept even if it's dead, the DFA then accepts nothing
+    order = [superstate for superstate in reachable if superstate in alive or superstate == dfa.starting_state]
+    if visit_counts is not None:
+        bfs_index = {superstate: index for index, superstate in enumerate(order)}
+        order.sort(key=lambda superstate: (-visit_counts.get(superstate, 0), bfs_index[superstate]))
+
     superstate_to_state: Dict[frozenset[State], State] = {}
-    for superstate in dfa.all_states:
+    for index, superstate in enumerate(order):
         superstate_to_state[superstate] = State(f"S{index}")
-        index += 1
     clean_start = superstate_to_state[dfa.starting_state]
-    clean_accepting = [superstate_to_state[superstate] for superstate in dfa.accepting_states]
+    accepting_superstates = set(dfa.accepting_states)
+    clean_accepting = [superstate_to_state[superstate] for superstate in order if superstate in accepting_superstates]
 
     clean_transitions: Dict[State, Set[Tuple[State, str]]] = {}
-    for superstate, transitions in dfa.transitions.items():
-        for next_superstate, char in transitions:
+    for index, superstate in enumerate(order):
+        if budget is not None and index % 1024 == 0:
+            budget.check_deadline("clean")
+        for next_superstate, char in dfa.transitions.get(superstate, ()):
+            if next_superstate not in superstate_to_state:
+                continue
             if superstate_to_state[superstate] in clean_transitions:
                 clean_transitions[superstate_to_state[superstate]].add((superstate_to_state[next_superstate], char))
             else:
@@ -145,3 +214,69 @@ def clean_dfa(dfa: DFA) -> DFAClean:
     clean_all_states = set(superstate_to_state.values())
 
     return DFAClean(clean_start, clean_accepting, clean_transitions, clean_all_states)
+
+
+def state_order(dfa: DFAClean) -> List[State]:
+    """
+    Returns the states of the given DFA in the order clean_dfa numbered them,
+    i.e S2 before S10, the labels not of that form come last in label order.
+    """
+
+    def key(state: State) -> Tuple[int, int, str]:
+        number = state.label[1:]
+        if state.label.startswith("S") and number.isdigit():
+            return (0, int(number), state.label)
+        return (1, 0, state.label)
+
+    return sorted(dfa.all_states, key=key)
+
+
+def profile_visits(dfa: DFAClean | DFA, corpus: Iterable[str]) -> Dict[State | frozenset[State], int]:
+    """
+    Runs the given DFA over every string of the corpus (like a matcher would, until its end
+    or a missing transition) and counts the visits of every state, for clean_dfa / minimize_dfa.
+
+    Args:
+        dfa: the DFA to profile, built with verbose=True (see char_transitions).
+        corpus: sample inputs, representative of the ones the DFA will be matched against.
+
+    Returns:
+        {state: visits} for the visited states, the states of a DFA are its superstates (frozensets of NFA states)
+        as clean_dfa expects them, the ones of a DFAClean are States as minimize_dfa expects them.
+    """
+    char_maps = char_transitions(dfa)
+    visit_counts: Dict[State | frozenset[State], int] = {}
+    for text in corpus:
+        state = dfa.starting_state
+        visit_counts[state] = visit_counts.get(state, 0) + 1
+        for char in text:
+            state = char_maps.get(state, {}).get(char)
+            if state is None:
+                break
+            visit_counts[state] = visit_counts.get(state, 0) + 1
+    return visit_counts
+
+
+def char_transitions(dfa: DFAClean) -> Dict[State, Dict[str, State]]:
+    """
+    Expands the edge labels of the given DFA (single chars or ranges like "a-z")
+    into one entry per character.
+
+    Args:
+        dfa: The DFA to expand, it should be built with verbose=True or at least
+        without overlapping labels leaving the same state.
+
+    Returns:
+        {state: {char: next_state}} for every state having transitions.
+    """
+    char_maps: Dict[State, Dict[str, State]] = {}
+    for state, transitions in dfa.transitions.items():
+        char_map = char_maps.setdefault(state, {})
+        for next_state, label in transitions:
+            first, last = label_to_range(label)
+            for code in range(ord(first), ord(last) + 1):
+                char = chr(code)
+                if char_map.get(char, next_state) != next_state:
+                    raise Exception(f"{state} has more than one transition on {char!r}, compile it with verbose=True")
+                char_map[char] = next_state
+    return char_maps
@@ -0,0 +1,127 @@
+# this file tells whether regexes accept the same language, either by checking
+# two DFAs against each other (Hopcroft-Karp, no minimization needed) or by a
+# canonical fingerprint of a minimized DFA that can be used as a hash key,
+# so loading a catalog of rules drops the duplicates in near linear time
+
+import hashlib
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+from nfa import State
+from dfa import DFAClean, char_transitions
+from compiler import compile_regex
+
+
+class __UnionFind:
+    def __init__(self):
+        self.parents: Dict[Hashable, Hashable] = {}
+
+    def find(self, item: Hashable) -> Hashable:
+        root = item
+        while self.parents.get(root, root) != root:
+            root = self.parents[root]
+        # path compression
+        while item != root:
+            self.parents[item], item = root, self.parents.get(item, item)
+        return root
+
+    def union(self, first: Hashable, second: Hashable) -> None:
+        self.parents[self.find(first)] = self.find(second)
+
+
+def are_equivalent(first: DFAClean, second: DFAClean) -> bool:
+    """
+    Tells whether the two DFAs accept the same language using Hopcroft-Karp,
+    the states reached by the same strings are merged in a union-find and the
+    DFAs differ iff an accepting state ends up merged with a rejecting one.
+    Missing transitions go to a dead (rejecting) state.
+    """
+    maps = (char_transitions(first), char_transitions(second))
+    accepting = (set(first.accepting_states), set(second.accepting_states))
+    # states are tagged with the index of their DFA, (index, None) is the dead state
+    start_pair = ((0, first.starting_state), (1, second.starting_state))
+    if (start_pair[0][1] in accepting[0]) != (start_pair[1][1] in accepting[1]):
+        return False
+
+    states = __UnionFind()
+    states.union(*start_pair)
+    pairs_to_process = [start_pair]
+    while pairs_to_process:
+        (first_index, first_state), (second_index, second_state) = pairs_to_process.pop()
+        first_map = maps[first_index].get(first_state, {})
+        second_map = maps[second_index].get(second_state, {})
+        for char in first_map.keys() | second_map.keys():
+            next_first = (first_index, first_map.get(char))
+            next_second = (second_index, second_map.get(char))
+            if states.find(next_first) == states.find(next_second):
+                continue
+            if (next_first[1] in accepting[first_index]) != (next_second[1] in accepting[second_index]):
+                return False
+            states.union(next_first, next_second)
+            pairs_to_process.append((next_first, next_second))
+    return True
+
+
+def __coaccessible(dfa: DFAClean) -> Set[State]:
+    # the states from which an accepting state can be reached
+    predecessors: Dict[State, Set[State]] = {}
+    for state, transitions in dfa.transitions.items():
+        for next_state, _ in transitions:
+            predecessors.setdefault(next_state, set()).add(state)
+    reached = set(dfa.accepting_states)
+    states_to_process = list(reached)
+    while states_to_process:
+        for previous in predecessors.get(states_to_process.pop(), ()):
+            if previous not in reached:
+                reached.add(previous)
+                states_to_process.append(previous)
+    return reached
+
+
+def fingerprint(mdfa: DFAClean) -> str:
+    """
+    Returns a canonical fingerprint of the language of the given minimized DFA (see mdfa.minimize_dfa),
+    regexes accepting the same language have the same fingerprint whatever the way they're written.
+
+    The states are renumbered in BFS order from the starting state following the edges in
+    sorted character order, the unreachable states and the ones that can't reach an accepting
+    state are left out, then the renumbered transitions are hashed.
+    """
+    char_maps = char_transitions(mdfa)
+    alive = __coaccessible(mdfa)
+    accepting = set(mdfa.accepting_states)
+    if mdfa.starting_state not in alive:
+        return hashlib.sha256(b"empty").hexdigest()
+
+    numbers = {mdfa.starting_state: 0}
+    order = [mdfa.starting_state]
+    rows: List[str] = []
+    for state in order:  # order grows while it's walked, i.e a BFS
+        edges: List[Tuple[str, int]] = []
+        for char, next_state in sorted(char_maps.get(state, {}).items()):
+            if next_state not in alive:
+                continue
+            if next_state not in numbers:
+                numbers[next_state] = len(numbers)
+                order.append(next_state)
+            edges.append((char, numbers[next_state]))
+        rows.append(("+" if state in accepting else "-") + repr(edges))
+    return hashlib.sha256("\n".join(rows).encode("utf-8")).hexdigest()
+
+
+def group_equivalent(patterns: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Compiles the given regexes and groups them by the language they accept.
+
+    Returns:
+        {fingerprint: [patterns accepting that language, in their original order]}
+    """
+    groups: Dict[str, List[str]] = {}
+    for pattern in patterns:
+        groups.setdefault(fingerprint(compile_regex(pattern, verbose=True)), []).append(pattern)
+    return groups
+
+
+def deduplicate(patterns: Iterable[str]) -> List[str]:
+    """
+    Returns the first of every group of regexes accepting the same language, in their original order.
+    """
+    return [group[0] for group in group_equivalent(patterns).values()]
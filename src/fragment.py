@@ -0,0 +1,251 @@
+# this file builds the NFA out of relocatable Thompson fragments
+# instead of the globally numbered S{index} states of nfa.py,
+# every fragment numbers its own states locally (0 .. size - 1) and is memoized by
+# the structure of its subtree, so recompiling an edited regex only builds the
+# fragments on the changed path of the AST and splices the cached ones
+
+from asttree import (
+    AstNode,
+    OrAstNode,
+    SeqAstNode,
+    StarAstNode,
+    PlusAstNode,
+    QuestionMarkAstNode,
+    LiteralCharacterAstNode,
+    CharacterClassAstNode,
+    GroupAstNode,
+)
+from budget import CompileBudget
+from lexer import Lexer
+from parser import Parser
+from nfa import State, EPSILON
+from dfa import DFAClean, build_powerset, clean_dfa
+from mdfa import minimize_dfa
+from typing import Dict, List, Tuple
+
+
+class NFAFragment:
+    """
+    A Thompson NFA piece with local state ids, it's made of its own edges
+    and of its children fragments placed at a (local) offset, so it's never copied
+    when it's reused as a part of a bigger fragment.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        start: int,
+        end: int,
+        edges: Tuple[Tuple[int, int, str], ...],
+        children: Tuple[Tuple["NFAFragment", int], ...] = (),
+    ):
+        self.size = size
+        self.start = start
+        self.end = end
+        self.edges = edges
+        self.children = children
+        self.edge_count = len(edges) + sum(child.edge_count for child, _ in children)
+
+
+# states are shared between all the compilations, S{i} is always the same object
+__state_pool: List[State] = []
+
+
+def __get_state(index: int) -> State:
+    while len(__state_pool) <= index:
+        __state_pool.append(State(f"S{len(__state_pool)}"))
+    return __state_pool[index]
+
+
+def materialize(fragment: NFAFragment) -> Tuple[Dict[State, List[Tuple[State, str]]], State, State]:
+    """
+    Splices the fragment and all of its children into one transition table
+    like the one of nfa.get_transition_table()
+
+    Returns:
+        (transition_table, starting_state, accepting_state)
+    """
+    __get_state(fragment.size)
+    pool = __state_pool
+    transition_table: Dict[State, List[Tuple[State, str]]] = {}
+    stack = [(fragment, 0)]
+    while stack:
+        current, offset = stack.pop()
+        for from_state, to_state, char in current.edges:
+            from_state = pool[from_state + offset]
+            edges = transition_table.get(from_state)
+            if edges is None:
+                edges = transition_table[from_state] = []
+            edges.append((pool[to_state + offset], char))
+        for child, child_offset in current.children:
+            stack.append((child, offset + child_offset))
+    return transition_table, pool[fragment.start], pool[fragment.end]
+
+
+class IncrementalCompiler:
+    """
+    Compiles regexes while memoizing the NFA fragment of every subtree it has seen,
+    fragments are keyed by the structure of the subtree (not by its position),
+    so the same subtree is shared wherever it appears in the regex.
+
+    Args:
+        verbose: expand ranges like [a-z] into one edge per character.
+        budget: optional limits, the NFA ones are checked on every new fragment.
+        max_generations: the fragments not reached by any of the last max_generations
+        built regexes are evicted, so a long editing session doesn't grow the cache forever.
+    """
+
+    def __init__(self, verbose: bool = False, budget: CompileBudget | None = None, max_generations: int = 4):
+        self.verbose = verbose
+        self.budget = budget
+        self.max_generations = max(1, max_generations)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # {(node type, children keys...): (key, fragment)}, the keys are interned into
+        # small ints so looking a node up is O(1) and not O(size of its subtree)
+        self.__cache: Dict[tuple, Tuple[int, NFAFragment]] = {}
+        # {cache key: the generation (built regex number) that last reached it}
+        self.__last_used: Dict[tuple, int] = {}
+        self.__generation = 0
+        self.__next_key = 0  # keys are never reused, an evicted one may still be in a parent's key
+
+    def clear(self) -> None:
+        self.__cache.clear()
+        self.__last_used.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.__cache)
+
+    def __evict(self) -> None:
+        oldest = self.__generation - self.max_generations
+        stale = [key for key, generation in self.__last_used.items() if generation <= oldest]
+        for key in stale:
+            del self.__cache[key]
+            del self.__last_used[key]
+        self.evictions += len(stale)
+
+    def build_fragment(self, input_regex: str, start_budget: bool = True) -> NFAFragment:
+        """
+        Args:
+            input_regex: the regex to build.
+            start_budget: restart the deadline clock and the statistics of the budget, callers building
+            many regexes under one budget (e.g scanner.Scanner) start it once themselves.
+
+        Returns:
+            the (relocatable) fragment of the regex NFA
+        """
+        if self.budget is not None and start_budget:
+            self.budget.start()
+        tokens = Lexer(input_regex, self.budget).tokenize()
+        ast = Parser(tokens).parse()
+        self.__generation += 1
+        _, fragment = self.__build(ast)
+        self.__evict()
+        return fragment
+
+    def build_nfa(self, input_regex: str) -> Tuple[Dict[State, List[Tuple[State, str]]], State, State]:
+        """
+        Returns:
+            (transition_table, starting_state, accepting_state) of the regex NFA
+        """
+        return materialize(self.build_fragment(input_regex))
+
+    def compile(self, input_regex: str) -> DFAClean:
+        """
+        Returns:
+            the minimized DFA of the regex, only its NFA part is incremental
+        """
+        nfa, starting_state, accepting_state = self.build_nfa(input_regex)
+        dfa = build_powerset(starting_state, accepting_state, nfa, self.budget)
+        return minimize_dfa(clean_dfa(dfa, budget=self.budget), self.budget)
+
+    def __build(self, node: AstNode) -> Tuple[int, NFAFragment]:
+        # returns the interned key of the subtree and its fragment,
+        # a subtree is looked up by its kind and the keys of its children
+        # so unchanged subtrees are found without building anything
+        kind = type(node)
+        if kind is GroupAstNode:
+            return self.__build(node.left)
+        if kind is LiteralCharacterAstNode:
+            key = (kind, node.char)
+            children = ()
+        elif kind is CharacterClassAstNode:
+            key = (kind, frozenset(node.char_class))
+            children = ()
+        elif kind is OrAstNode or kind is SeqAstNode:
+            left_key, left = self.__build(node.left)
+            right_key, right = self.__build(node.right)
+            key = (kind, left_key, right_key)
+            children = (left, right)
+        elif node is None:
+            key = (kind,)
+            children = ()
+        else:
+            child_key, child = self.__build(node.left)
+            key = (kind, child_key)
+            children = (child,)
+        self.__last_used[key] = self.__generation
+        cached = self.__cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        fragment = self.__make_fragment(node, children)
+        if self.budget is not None:
+            self.budget.check_nfa(fragment.size, fragment.edge_count)
+        cached = self.__cache[key] = (self.__next_key, fragment)
+        self.__next_key += 1
+        return cached
+
+    def __make_fragment(self, node: AstNode, children: Tuple[NFAFragment, ...]) -> NFAFragment:
+        if node is None:
+            return NFAFragment(2, 0, 1, ())
+        if isinstance(node, LiteralCharacterAstNode):
+            return NFAFragment(2, 0, 1, ((0, 1, node.char),))
+        if isinstance(node, CharacterClassAstNode):
+            return NFAFragment(2, 0, 1, tuple((0, 1, label) for label in self.__class_labels(node)))
+        if isinstance(node, OrAstNode):
+            # S0 -e-> left -e-> S_end, S0 -e-> right -e-> S_end
+            left, right = children
+            right_offset = 1 + left.size
+            end = right_offset + right.size
+            edges = (
+                (0, 1 + left.start, EPSILON),
+                (0, right_offset + right.start, EPSILON),
+                (1 + left.end, end, EPSILON),
+                (right_offset + right.end, end, EPSILON),
+            )
+            return NFAFragment(end + 1, 0, end, edges, ((left, 1), (right, right_offset)))
+        if isinstance(node, SeqAstNode):
+            # left -e-> right
+            left, right = children
+            edges = ((left.end, left.size + right.start, EPSILON),)
+            return NFAFragment(left.size + right.size, left.start, left.size + right.end, edges, ((left, 0), (right, left.size)))
+        # the counters all wrap their child between a new start (0) and a new end
+        (child,) = children
+        end = 1 + child.size
+        edges = [(0, 1 + child.start, EPSILON), (1 + child.end, end, EPSILON)]
+        if isinstance(node, (StarAstNode, QuestionMarkAstNode)):
+            edges.append((0, end, EPSILON))  # skip it
+        if isinstance(node, (StarAstNode, PlusAstNode)):
+            edges.append((1 + child.end, 1 + child.start, EPSILON))  # repeat it
+        return NFAFragment(end + 1, 0, end, tuple(edges), ((child, 1),))
+
+    def __class_labels(self, node: CharacterClassAstNode) -> List[str]:
+        # same labels as nfa.py, "a-z" edges or one edge per character when verbose
+        if not self.verbose:
+            return [char if isinstance(char, str) else f"{char[0]}-{char[1]}" for char in node.char_class]
+        all_chars = set()
+        for char in node.char_class:
+            if isinstance(char, str):
+                all_chars.add(char)
+            else:
+                if self.budget is not None:
+                    self.budget.check_nfa(2, len(all_chars) + ord(char[1]) - ord(char[0]) + 1)
+                for c in range(ord(char[0]), ord(char[1]) + 1):
+                    all_chars.add(chr(c))
+        return sorted(all_chars)
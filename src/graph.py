@@ -1,9 +1,252 @@
 # this file should be used to visualize the nfa, dfa and mdfa
+#
+# the parallel edges between two states are merged into one edge labelled by the ranges they cover
+# (like "0-9,a-z" instead of 36 edges for a verbose [a-z0-9]), the automata with more than max_states
+# states are drawn summarized (summary="scc" draws one node per strongly connected component,
+# summary="hot" keeps the hot_states hottest states and merges the others into one node) or written
+# as plain DOT text without running the (slow) graphviz layout (summary="dot"), and every render is
+# keyed by a canonical fingerprint of the automaton and of the drawing options, written at the top of
+# the DOT file, a render is skipped when the files an earlier one wrote (in any process) still hold
+# that fingerprint and its picture, so drawing the same automaton again costs nothing
 
+import hashlib
+import os
 import graphviz
-from typing import Dict, List, Tuple
-from nfa import State
-from dfa import DFA, DFAClean
+from typing import Callable, Dict, Hashable, Iterable, List, Tuple
+from nfa import State, EPSILON, label_to_range
+from dfa import DFA, DFAClean, state_order
+
+SUMMARIES = ["scc", "hot", "dot"]
+
+
+def __char_str(code: int) -> str:
+    # the separators of the labels are escaped too, so "-" and "," are never ambiguous
+    char = chr(code)
+    if char.isprintable() and not char.isspace() and char not in ",-\\":
+        return char
+    return f"U+{code:04X}"
+
+
+def merge_labels(labels: Iterable[str]) -> str:
+    """
+    Returns one label covering all the given edge labels (single chars or ranges like "a-z"),
+    the chars are merged into sorted ranges, e.g ["b", "a", "c", "x", "0-9"] gives "0-9,a-c,x".
+    """
+    epsilon = False
+    ranges: List[Tuple[int, int]] = []
+    for label in labels:
+        if label == EPSILON:
+            epsilon = True
+            continue
+        first, last = label_to_range(label)
+        ranges.append((ord(first), ord(last)))
+    merged: List[List[int]] = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    parts = [EPSILON] if epsilon else []
+    for first, last in merged:
+        if first == last:
+            parts.append(__char_str(first))
+        elif first + 1 == last:
+            parts += [__char_str(first), __char_str(last)]
+        else:
+            parts.append(f"{__char_str(first)}-{__char_str(last)}")
+    return ",".join(parts)
+
+
+def __fingerprint(
+    name: str,
+    title: str,
+    states: List[str],
+    start: str,
+    accepting: List[str],
+    edges: Dict[Tuple[str, str], List[str]],
+    layout: bool,
+    max_states: int,
+    summary: str,
+    hot_states: int,
+    visit_counts: Dict[str, int] | None,
+) -> str:
+    # the states are kept in their order since the summaries depend on it, the rest is sorted
+    # so the same automaton drawn the same way always gets the same fingerprint
+    description = (
+        name, title, states, start, sorted(accepting),
+        sorted((x, y, merge_labels(labels)) for (x, y), labels in edges.items()),
+        layout, max_states, summary, hot_states, None if visit_counts is None else sorted(visit_counts.items()),
+    )
+    return hashlib.sha256(repr(description).encode("utf-8")).hexdigest()
+
+
+def __up_to_date(fingerprint: str, source_path: str, output_path: str | None) -> bool:
+    # whether the DOT file was written for this fingerprint (on its first line) and the picture (if any)
+    # was rendered after it, another graph drawn to the same filename since then rewrote the DOT file
+    try:
+        with open(source_path, encoding="utf-8") as f:
+            if f.readline() != f"// fingerprint {fingerprint}\n":
+                return False
+        return output_path is None or os.path.getmtime(output_path) >= os.path.getmtime(source_path)
+    except OSError:
+        return False
+
+
+def __merge_edges(
+    transitions: Dict[Hashable, Iterable[Tuple[Hashable, str]]], name: Callable[[Hashable], str]
+) -> Dict[Tuple[str, str], List[str]]:
+    # {(from, to): labels of all the edges between them}
+    edges: Dict[Tuple[str, str], List[str]] = {}
+    for state, state_transitions in transitions.items():
+        for next_state, char in state_transitions:
+            edges.setdefault((name(state), name(next_state)), []).append(char)
+    return edges
+
+
+def __components(states: List[str], edges: Dict[Tuple[str, str], List[str]]) -> Dict[str, int]:
+    # Tarjan's strongly connected components (iterative), returns {state: component number}
+    # where the components are numbered in the order of their first state in states
+    successors: Dict[str, List[str]] = {state: [] for state in states}
+    for x, y in edges:
+        successors[x].append(y)
+    index: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack = set()
+    found: List[List[str]] = []
+    for root in states:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            state, child = work.pop()
+            if child == 0:
+                index[state] = low[state] = len(index)
+                stack.append(state)
+                on_stack.add(state)
+            if child < len(successors[state]):
+                work.append((state, child + 1))
+                next_state = successors[state][child]
+                if next_state not in index:
+                    work.append((next_state, 0))
+                elif next_state in on_stack:
+                    low[state] = min(low[state], index[next_state])
+                continue
+            if low[state] == index[state]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == state:
+                        break
+                found.append(component)
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[state])
+    position = {state: i for i, state in enumerate(states)}
+    found.sort(key=lambda component: min(position[state] for state in component))
+    return {state: number for number, component in enumerate(found) for state in component}
+
+
+def __group_name(members: List[str], limit: int = 4) -> str:
+    shown = ", ".join(members[:limit])
+    return f"{{{shown}, ... ({len(members)} states)}}" if len(members) > limit else f"{{{shown}}}"
+
+
+def __summarize(
+    states: List[str],
+    start: str,
+    accepting: List[str],
+    edges: Dict[Tuple[str, str], List[str]],
+    summary: str,
+    hot_states: int,
+    visit_counts: Dict[str, int] | None,
+) -> Tuple[List[str], str, List[str], Dict[Tuple[str, str], List[str]]]:
+    # maps every state to the node standing for it, then merges the edges between the nodes
+    if summary == "scc":
+        components = __components(states, edges)
+        members: Dict[int, List[str]] = {}
+        for state in states:
+            members.setdefault(components[state], []).append(state)
+        node_of = {state: __group_name(members[components[state]]) if len(members[components[state]]) > 1 else state for state in states}
+    else:
+        if visit_counts is None:
+            # without a profile (see dfa.profile_visits), the states with the most edges are the hot ones
+            visit_counts = {state: 0 for state in states}
+            for (x, y), labels in edges.items():
+                visit_counts[x] = visit_counts.get(x, 0) + len(labels)
+                visit_counts[y] = visit_counts.get(y, 0) + len(labels)
+        position = {state: i for i, state in enumerate(states)}
+        hot = sorted(states, key=lambda state: (-visit_counts.get(state, 0), position[state]))[:hot_states]
+        kept = set(hot) | {start}
+        others = [state for state in states if state not in kept]
+        others_name = f"{len(others)} other states"
+        node_of = {state: state if state in kept else others_name for state in states}
+    nodes = list(dict.fromkeys(node_of[state] for state in states))
+    summary_edges: Dict[Tuple[str, str], List[str]] = {}
+    for (x, y), labels in edges.items():
+        summary_edges.setdefault((node_of[x], node_of[y]), []).extend(labels)
+    summary_accepting = list(dict.fromkeys(node_of[state] for state in accepting))
+    return nodes, node_of[start], summary_accepting, summary_edges
+
+
+def __draw(
+    name: str,
+    title: str,
+    states: List[str],
+    start: str,
+    accepting: List[str],
+    edges: Dict[Tuple[str, str], List[str]],
+    filename: str,
+    view: bool,
+    max_states: int,
+    summary: str,
+    hot_states: int,
+    visit_counts: Dict[str, int] | None,
+) -> str:
+    if summary not in SUMMARIES:
+        raise Exception(f"unknown summary {summary!r}, it should be one of {SUMMARIES}")
+    # the states only known by their edges (e.g the accepting state of the NFA) come last
+    states = list(dict.fromkeys(states + [state for edge in edges for state in edge]))
+    layout = len(states) <= max_states or summary != "dot"
+    fingerprint = __fingerprint(name, title, states, start, accepting, edges, layout, max_states, summary, hot_states, visit_counts)
+    output_path = f"{filename}.png" if layout else None
+    if __up_to_date(fingerprint, filename, output_path):
+        if view and layout:
+            graphviz.view(output_path)
+        return output_path or filename
+
+    summaries = []
+    if len(states) > max_states and summary == "scc":
+        states, start, accepting, edges = __summarize(states, start, accepting, edges, "scc", hot_states, None)
+        summaries.append("scc")
+        visit_counts = None  # they were counted for the states, not the components
+    if len(states) > max_states and summary in ("scc", "hot"):
+        # still too big for "scc" when there are many components, e.g without loops every state is one
+        states, start, accepting, edges = __summarize(states, start, accepting, edges, "hot", hot_states, visit_counts)
+        summaries.append("hot")
+    if summaries:
+        title += f" ({' + '.join(summaries)} summary)"
+
+    g = graphviz.Digraph(name, comment=f"fingerprint {fingerprint}", filename=filename, format="png")
+    # make the graph horizontal
+    g.attr(rankdir="LR")
+    g.edge("", start)  # add an arrow entering the starting state
+    g.node("", shape="none")  # and remove the very first circle
+    position = {state: i for i, state in enumerate(states)}
+    for x, y in sorted(edges, key=lambda edge: (position[edge[0]], position[edge[1]])):
+        g.edge(x, y, label=merge_labels(edges[(x, y)]))
+    # add another oval for the accepting states
+    for accepting_state in accepting:
+        g.node(accepting_state, peripheries="2")
+    # add a title two lines under the graph
+    g.attr(label=rf"\n\n{title}", fontsize="20", labelloc="b")
+
+    if layout:
+        return g.render(view=view)
+    # only the DOT text, it can be laid out later with e.g `sfdp -Tsvg` which scales better than dot
+    return g.save()
 
 
 def visualize_nfa(
@@ -11,68 +254,103 @@ def visualize_nfa(
     starting_state: State,
     accepting_state: State,
     filename: str = "NFA",
-):
-    g = graphviz.Digraph("NFA", filename=filename, format="png")
-    # make the graph horizontal
-    g.attr(rankdir="LR")
-    g.edge("", starting_state.label)  # add an arrow entering the starting state
-    g.node("", shape="none")  # and remove the very first circle
-    for state, transitions in transition_table.items():
-        for next_state, char in transitions:
-            g.edge(state.label, next_state.label, label=char)
-    # add another oval for the accepting state
-    g.node(accepting_state.label, peripheries="2")
-    # add a title two lines under the graph
-    g.attr(label=r"\n\nNFA", fontsize="20", labelloc="b")
-    g.view()
+    view: bool = True,
+    max_states: int = 200,
+    summary: str = "scc",
+    hot_states: int = 50,
+    visit_counts: Dict[State, int] | None = None,
+) -> str:
+    """
+    Draws the NFA, the parallel edges are merged into one edge labelled by ranges.
+
+    Args:
+        filename: the file to write, without the extension.
+        view: open the picture once rendered.
+        max_states: the max number of states drawn as is, a bigger automaton is summarized.
+        summary: how to draw a big automaton, "scc" (one node per strongly connected component),
+        "hot" (the hot_states hottest states and one node for the others) or "dot" (no layout, only the DOT text).
+        hot_states: the number of states kept by the "hot" summary.
+        visit_counts: the hotness of the states (see dfa.profile_visits), defaults to their number of edges.
+
+    Returns:
+        the path of the written file (the DOT text for "dot").
+    """
+    states = [starting_state.label] + [state.label for state in transition_table]
+    edges = __merge_edges(transition_table, lambda state: state.label)
+    counts = None if visit_counts is None else {state.label: count for state, count in visit_counts.items()}
+    return __draw(
+        "NFA", "NFA", states, starting_state.label, [accepting_state.label], edges,
+        filename, view, max_states, summary, hot_states, counts,
+    )
 
 
 def __frozenset_str(frozenset: frozenset[State]) -> str:
     """
-    Returns the name of the given frozenset like in set.__str__
+    Returns the name of the given frozenset like in set.__str__, its states are sorted
+    so the name doesn't depend on the (per process) hashes of their labels
     """
-    return "{" + ", ".join([state.label for state in frozenset]) + "}"
+    return "{" + ", ".join(sorted(state.label for state in frozenset)) + "}"
 
 
-def visualize_dfa(dfa: DFA, filename: str = "DFA"):
-    g = graphviz.Digraph("DFA", filename=filename, format="png")
-    g.attr(rankdir="LR")
-    g.edge("", __frozenset_str(dfa.starting_state))
-    g.node("", shape="none")
-    for state, transitions in dfa.transitions.items():
-        x = __frozenset_str(state)
-        for next_state, char in transitions:
-            y = __frozenset_str(next_state)
-            g.edge(x, y, label=char)
-    for accepting_state in dfa.accepting_states:
-        g.node(__frozenset_str(accepting_state), peripheries="2")
-    g.attr(label=r"\n\nDFA", fontsize="20", labelloc="b")
-    g.view()
-
-
-def visualize_clean_dfa(clean_dfa: DFAClean, filename: str = "DFAClean"):
-    g = graphviz.Digraph("DFAClean", filename=filename, format="png")
-    g.attr(rankdir="LR")
-    g.edge("", clean_dfa.starting_state.label)
-    g.node("", shape="none")
-    for state, transitions in clean_dfa.transitions.items():
-        for next_state, char in transitions:
-            g.edge(state.label, next_state.label, label=char)
-    for accepting_state in clean_dfa.accepting_states:
-        g.node(accepting_state.label, peripheries="2")
-    g.attr(label=r"\n\nDFA Clean", fontsize="20", labelloc="b")
-    g.view()
-
-
-def visualize_mdfa(mdfa: DFAClean, filename: str = "MDFA"):
-    g = graphviz.Digraph("MDFA", filename=filename, format="png")
-    g.attr(rankdir="LR")
-    g.edge("", mdfa.starting_state.label)
-    g.node("", shape="none")
-    for state, transitions in mdfa.transitions.items():
-        for next_state, char in transitions:
-            g.edge(state.label, next_state.label, label=char)
-    for accepting_state in mdfa.accepting_states:
-        g.node(accepting_state.label, peripheries="2")
-    g.attr(label=r"\n\nMinimized DFA", fontsize="20", labelloc="b")
-    g.view()
+def visualize_dfa(
+    dfa: DFA,
+    filename: str = "DFA",
+    view: bool = True,
+    max_states: int = 200,
+    summary: str = "scc",
+    hot_states: int = 50,
+    visit_counts: Dict[frozenset[State], int] | None = None,
+) -> str:
+    """
+    Draws the DFA of the powerset construction, see visualize_nfa for the arguments.
+    """
+    states = [__frozenset_str(dfa.starting_state)] + sorted(__frozenset_str(state) for state in dfa.all_states)
+    edges = __merge_edges(dfa.transitions, __frozenset_str)
+    counts = None if visit_counts is None else {__frozenset_str(state): count for state, count in visit_counts.items()}
+    return __draw(
+        "DFA", "DFA", states, __frozenset_str(dfa.starting_state), [__frozenset_str(state) for state in dfa.accepting_states],
+        edges, filename, view, max_states, summary, hot_states, counts,
+    )
+
+
+def __visualize_clean(
+    name: str, title: str, dfa: DFAClean, filename: str, view: bool, max_states: int, summary: str, hot_states: int,
+    visit_counts: Dict[State, int] | None,
+) -> str:
+    states = [dfa.starting_state.label] + [state.label for state in state_order(dfa)]
+    edges = __merge_edges(dfa.transitions, lambda state: state.label)
+    counts = None if visit_counts is None else {state.label: count for state, count in visit_counts.items()}
+    return __draw(
+        name, title, states, dfa.starting_state.label, [state.label for state in dfa.accepting_states],
+        edges, filename, view, max_states, summary, hot_states, counts,
+    )
+
+
+def visualize_clean_dfa(
+    clean_dfa: DFAClean,
+    filename: str = "DFAClean",
+    view: bool = True,
+    max_states: int = 200,
+    summary: str = "scc",
+    hot_states: int = 50,
+    visit_counts: Dict[State, int] | None = None,
+) -> str:
+    """
+    Draws the cleaned DFA, see visualize_nfa for the arguments.
+    """
+    return __visualize_clean("DFAClean", "DFA Clean", clean_dfa, filename, view, max_states, summary, hot_states, visit_counts)
+
+
+def visualize_mdfa(
+    mdfa: DFAClean,
+    filename: str = "MDFA",
+    view: bool = True,
+    max_states: int = 200,
+    summary: str = "scc",
+    hot_states: int = 50,
+    visit_counts: Dict[State, int] | None = None,
+) -> str:
+    """
+    Draws the minimized DFA, see visualize_nfa for the arguments.
+    """
+    return __visualize_clean("MDFA", "Minimized DFA", mdfa, filename, view, max_states, summary, hot_states, visit_counts)
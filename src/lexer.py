@@ -2,6 +2,7 @@
 # it is used to tokenize the input file
 
 from enum import Enum, auto
+from budget import CompileBudget
 
 
 # | * + ? ( ) [ ] - are the meta characters
@@ -44,13 +45,16 @@ class Lexer:
         "-": TokenType.DASH,
     }
 
-    def __init__(self, input_regex: str):
+    def __init__(self, input_regex: str, budget: CompileBudget | None = None):
         self.input_regex = input_regex
         self.tokens = []
+        self.budget = budget
 
     def tokenize(self) -> list[Token]:
         prev_char = None
-        for char in self.input_regex:
+        for position, char in enumerate(self.input_regex):
+            if self.budget is not None and position % 1024 == 0:
+                self.budget.check_tokens(len(self.tokens))
             if char == Lexer.Escape_Character:
                 prev_char = char
                 continue
@@ -59,6 +63,8 @@ class Lexer:
             else:
                 self.tokens.append(Token(TokenType.LITERAL_CHARACTER, char))
             prev_char = char
+        if self.budget is not None:
+            self.budget.check_tokens(len(self.tokens))
         return self.tokens
 
 
@@ -6,6 +6,7 @@ from dfa import build_powerset, clean_dfa
 from mdfa import minimize_dfa
 from logger import log_nfa, log_mdfa
 from graph import visualize_nfa, visualize_dfa, visualize_clean_dfa, visualize_mdfa
+from budget import CompileBudget
 
 
 def get_args():
@@ -22,11 +23,27 @@ def get_args():
         action="store_true",
         help="expand ranges like [a-z] to [a, b, c, ..., z] not just [a-z] on one edge",
     )
+    # optional resource limits, compilation stops with an error once one of them is hit
+    parser.add_argument("--max-nfa-states", type=int, default=None, help="max number of NFA states")
+    parser.add_argument("--max-dfa-states", type=int, default=None, help="max number of DFA states")
+    parser.add_argument("--max-transitions", type=int, default=None, help="max number of NFA/DFA transitions")
+    parser.add_argument("--deadline", type=float, default=None, help="max number of seconds to compile")
+    # the automata with more states than that are drawn summarized, or only written as DOT text with --summary dot
+    parser.add_argument("--max-states", type=int, default=200, help="max number of states drawn as is")
+    parser.add_argument("--summary", choices=["scc", "hot", "dot"], default="scc", help="how to draw bigger automata")
     return parser.parse_args()
 
 
-def run(input_regex: str, verbose: bool = False):
-    lexer = Lexer(input_regex)
+def run(
+    input_regex: str,
+    verbose: bool = False,
+    budget: CompileBudget | None = None,
+    max_states: int = 200,
+    summary: str = "scc",
+):
+    if budget is not None:
+        budget.start()
+    lexer = Lexer(input_regex, budget)
     tokens = lexer.tokenize()
 
     parser = Parser(tokens)
@@ -34,28 +51,29 @@ def run(input_regex: str, verbose: bool = False):
     print(tokens)
     print(ast)
 
-    ast_to_nfa(ast, verbose=verbose)
+    ast_to_nfa(ast, verbose=verbose, budget=budget)
     nfa = get_transition_table()
 
     starting_state = get_starting_state()
     accepting_state = get_accepting_state()
     log_nfa(nfa, starting_state, accepting_state)
-    visualize_nfa(nfa, starting_state, accepting_state)
+    visualize_nfa(nfa, starting_state, accepting_state, max_states=max_states, summary=summary)
 
-    dfa = build_powerset(starting_state, accepting_state, nfa)
-    visualize_dfa(dfa)
+    dfa = build_powerset(starting_state, accepting_state, nfa, budget)
+    visualize_dfa(dfa, max_states=max_states, summary=summary)
 
-    cdfa = clean_dfa(dfa)
-    visualize_clean_dfa(cdfa)
+    cdfa = clean_dfa(dfa, budget=budget)
+    visualize_clean_dfa(cdfa, max_states=max_states, summary=summary)
 
-    mdfa = minimize_dfa(cdfa)
+    mdfa = minimize_dfa(cdfa, budget)
     log_mdfa(mdfa)
-    visualize_mdfa(mdfa, "MDFA")
+    visualize_mdfa(mdfa, "MDFA", max_states=max_states, summary=summary)
 
 
 def main():
     args = get_args()
-    run(args.regex, args.verbose)
+    budget = CompileBudget(args.max_nfa_states, args.max_dfa_states, args.max_transitions, args.deadline)
+    run(args.regex, args.verbose, budget, args.max_states, args.summary)
 
 
 if __name__ == "__main__":
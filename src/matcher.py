@@ -0,0 +1,200 @@
+# this file holds the engines that run the compiled automata over an input string
+
+from typing import Dict, List, Set, Tuple
+from nfa import State, EPSILON, label_to_range
+from dfa import DFAClean, char_transitions, state_order
+
+
+class NFAMatcher:
+    """
+    Simulates the (non-determinized) Thompson NFA directly by keeping the set of
+    active states, it never builds the powerset so it's used as a fallback when
+    the DFA would be too big, at the cost of O(len(text) * NFA states) matching.
+    """
+
+    def __init__(
+        self,
+        starting_state: State,
+        accepting_state: State,
+        transitions: Dict[State, List[Tuple[State, str]]],
+    ):
+        self.starting_state = starting_state
+        self.accepting_state = accepting_state
+        self.epsilon_moves: Dict[State, List[State]] = {}
+        self.char_moves: Dict[State, List[Tuple[str, str, State]]] = {}
+        for state, edges in transitions.items():
+            for next_state, char in edges:
+                if char == EPSILON:
+                    self.epsilon_moves.setdefault(state, []).append(next_state)
+                else:
+                    first, last = label_to_range(char)
+                    self.char_moves.setdefault(state, []).append((first, last, next_state))
+
+    def __epsilon_closure(self, states: Set[State]) -> Set[State]:
+        closure = set(states)
+        stack = list(states)
+        while stack:
+            state = stack.pop()
+            for next_state in self.epsilon_moves.get(state, []):
+                if next_state not in closure:
+                    closure.add(next_state)
+                    stack.append(next_state)
+        return closure
+
+    def fullmatch(self, text: str) -> bool:
+        current = self.__epsilon_closure({self.starting_state})
+        for char in text:
+            moved = set()
+            for state in current:
+                for first, last, next_state in self.char_moves.get(state, []):
+                    if first <= char <= last:
+                        moved.add(next_state)
+            if not moved:
+                return False
+            current = self.__epsilon_closure(moved)
+        return self.accepting_state in current
+
+
+class DFATable:
+    """
+    The flat tables of a DFA, the states are numbered 0 .. num_states - 1 and the characters
+    are grouped into classes (characters having the same transitions in every state)
+    so the transitions are a dense num_states x num_classes row-major list.
+
+    Attributes:
+        start: the starting state.
+        accepting: accepting[state] is True for the accepting states.
+        class_map: {char: class}, characters out of it have no transitions at all.
+        transitions: transitions[state * num_classes + class] is the next state or -1.
+        state_labels: the labels of the states in the original DFA.
+    """
+
+    def __init__(self, dfa: DFAClean):
+        char_maps = char_transitions(dfa)
+        states = state_order(dfa)
+        state_ids = {state: index for index, state in enumerate(states)}
+        alphabet = sorted({char for char_map in char_maps.values() for char in char_map})
+
+        columns: Dict[Tuple[int, ...], int] = {}
+        self.class_map: Dict[str, int] = {}
+        for char in alphabet:
+            column = tuple(
+                state_ids[char_maps[state][char]] if char in char_maps.get(state, {}) else -1 for state in states
+            )
+            if column not in columns:
+                columns[column] = len(columns)
+            self.class_map[char] = columns[column]
+
+        self.num_states = len(states)
+        self.num_classes = len(columns)
+        self.transitions: List[int] = [-1] * (self.num_states * self.num_classes)
+        for column, char_class in columns.items():
+            for state, next_state in enumerate(column):
+                self.transitions[state * self.num_classes + char_class] = next_state
+        accepting_states = set(dfa.accepting_states)
+        self.accepting: List[bool] = [state in accepting_states for state in states]
+        self.start = state_ids[dfa.starting_state]
+        self.state_labels: List[str] = [state.label for state in states]
+        self.__byte_classes: List[int] | None = None
+
+    def byte_classes(self) -> List[int]:
+        """
+        Returns {byte: class} as a flat list of 256 classes, -1 for the bytes that have no transitions,
+        it's built once and shared by everything running the table over bytes-like inputs.
+        """
+        if self.__byte_classes is None:
+            self.__byte_classes = [self.class_map.get(chr(byte), -1) for byte in range(256)]
+        return self.__byte_classes
+
+
+class DFAMatcher:
+    """
+    Runs a DFATable over the input by indexing the tables for every character.
+    """
+
+    def __init__(self, table: DFATable):
+        self.table = table
+
+    def fullmatch(self, text: str) -> bool:
+        class_map = self.table.class_map
+        transitions = self.table.transitions
+        num_classes = self.table.num_classes
+        state = self.table.start
+        for char in text:
+            char_class = class_map.get(char)
+            if char_class is None:
+                return False
+            state = transitions[state * num_classes + char_class]
+            if state < 0:
+                return False
+        return self.table.accepting[state]
+
+    def match_at(self, text: str, pos: int = 0) -> int:
+        """
+        Returns the end of the longest match starting at pos, or -1 if there's none.
+        """
+        class_map = self.table.class_map
+        transitions = self.table.transitions
+        num_classes = self.table.num_classes
+        accepting = self.table.accepting
+        state = self.table.start
+        end = pos if accepting[state] else -1
+        for index in range(pos, len(text)):
+            char_class = class_map.get(text[index])
+            if char_class is None:
+                break
+            state = transitions[state * num_classes + char_class]
+            if state < 0:
+                break
+            if accepting[state]:
+                end = index + 1
+        return end
+
+
+class ByteDFAMatcher:
+    """
+    Runs a DFATable compiled with byte_level=True directly over a bytes-like buffer
+    (bytes, bytearray, memoryview, mmap, ...) without decoding or copying it.
+    """
+
+    def __init__(self, table: DFATable):
+        self.table = table
+        self.byte_classes = table.byte_classes()
+
+    def fullmatch(self, data) -> bool:
+        byte_classes = self.byte_classes
+        transitions = self.table.transitions
+        num_classes = self.table.num_classes
+        state = self.table.start
+        with memoryview(data) as view:
+            for byte in view.cast("B"):
+                char_class = byte_classes[byte]
+                if char_class < 0:
+                    return False
+                state = transitions[state * num_classes + char_class]
+                if state < 0:
+                    return False
+        return self.table.accepting[state]
+
+    def match_at(self, data, pos: int = 0) -> int:
+        """
+        Returns the end (a byte offset) of the longest match starting at the byte offset pos, or -1 if there's none.
+        """
+        byte_classes = self.byte_classes
+        transitions = self.table.transitions
+        num_classes = self.table.num_classes
+        accepting = self.table.accepting
+        state = self.table.start
+        end = pos if accepting[state] else -1
+        with memoryview(data) as view:
+            view = view.cast("B")
+            for index in range(pos, len(view)):
+                char_class = byte_classes[view[index]]
+                if char_class < 0:
+                    break
+                state = transitions[state * num_classes + char_class]
+                if state < 0:
+                    break
+                if accepting[state]:
+                    end = index + 1
+        return end
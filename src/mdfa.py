@@ -3,6 +3,7 @@
 from typing import Dict, List, Tuple, Set
 from nfa import State, EPSILON
 from dfa import DFA, DFAClean, clean_dfa
+from budget import CompileBudget
 from copy import deepcopy
 
 
@@ -11,7 +12,19 @@ class Hashabledict(dict):
         return hash(frozenset(self.items()))
 
 
-def minimize_dfa(cdfa: DFAClean) -> DFAClean:
+def minimize_dfa(
+    cdfa: DFAClean, budget: CompileBudget | None = None, visit_counts: Dict[State, int] | None = None
+) -> DFAClean:
+    """
+    Minimizes the given DFA by splitting its states into groups until the states
+    of every group have the same transitions (to the same groups).
+
+    Args:
+        cdfa: the DFA to minimize.
+        budget: optional limits, its deadline is checked while splitting every group and while cleaning.
+        visit_counts: optional {state: visits} profile of cdfa (see dfa.profile_visits),
+        a group is as hot as its states are and the hottest groups are numbered first.
+    """
     accepting_states = set(cdfa.accepting_states)
     rejecting_states = cdfa.all_states - accepting_states
     accepting_states = frozenset(accepting_states)
@@ -28,9 +41,14 @@ def minimize_dfa(cdfa: DFAClean) -> DFAClean:
     still_splitting = True
 
     while still_splitting:
+        if budget is not None:
+            budget.check_minimize(len(mdfa_all_groups))
         still_splitting = False
         mdfa_all_groups_copy = deepcopy(mdfa_all_groups)
         for group in mdfa_all_groups:
+            if budget is not None:
+                # a single round can take long on a big DFA, so the deadline is checked per group
+                budget.check_deadline("minimize")
             if len(group) > 1:
                 possible_splits = {}
                 for state in group:
@@ -70,5 +88,12 @@ def minimize_dfa(cdfa: DFAClean) -> DFAClean:
     for group in mdfa_all_groups:
         mdfa_all_states.add(frozenset(group))
 
+    group_counts = None
+    if visit_counts is not None:
+        group_counts = {}
+        for state, visits in visit_counts.items():
+            if state in which_group:
+                group_counts[which_group[state]] = group_counts.get(which_group[state], 0) + visits
+
     intermediate = DFA(mdfa_starting_state, mdfa_accepting_states, mdfa_transitions, mdfa_all_states)
-    return clean_dfa(intermediate)
+    return clean_dfa(intermediate, group_counts, budget)
@@ -4,7 +4,7 @@
 # ast file has the following classes:
 #   - AstNode (abstract class)
 #   - OrAstNode, SeqAstNode, StarAstNode, PlusAstNode,
-#   - QuestionMarkAstNode, LiteralCharacterAstNode, CharacterClassAstNode
+#   - QuestionMarkAstNode, LiteralCharacterAstNode, CharacterClassAstNode, GroupAstNode
 
 from asttree import (
     AstNode,
@@ -15,7 +15,9 @@ from asttree import (
     QuestionMarkAstNode,
     LiteralCharacterAstNode,
     CharacterClassAstNode,
+    GroupAstNode,
 )
+from budget import CompileBudget
 from enum import Enum
 from typing import Dict, List, Set, Tuple
 
@@ -68,6 +70,22 @@ __starting_state, __accepting_state = State(None), State(None)
 # i.e whether to expand ranges like [a-z] to [a, b, c, ..., z] or not
 __verbose = False
 
+# the optional resource limits to respect while building the NFA
+# and the states seen so far to check them against
+__budget: CompileBudget | None = None
+__seen_states: Set[State] = set()
+__transition_count = 0
+
+
+def label_to_range(label: str) -> Tuple[str, str]:
+    """
+    Returns the (first, last) characters matched by the given edge label,
+    labels are either a single character or a range like "a-z" (see __character_class_ast_to_nfa)
+    """
+    if len(label) == 3 and label[1] == "-":
+        return (label[0], label[2])
+    return (label, label)
+
 
 def get_transition_table() -> Dict[State, List[Tuple[State, str]]]:
     return __transition_table
@@ -83,19 +101,29 @@ def get_accepting_state() -> State:
     return __accepting_state
 
 
-def ast_to_nfa(root: AstNode, verbose: bool = False) -> None:
-    global __verbose
+def ast_to_nfa(root: AstNode, verbose: bool = False, budget: CompileBudget | None = None) -> None:
+    global __verbose, __budget, __transition_table, __seen_states, __transition_count
     __verbose = verbose
+    __budget = budget
+    # start from a fresh table so compiling many regexes in one process doesn't mix them up
+    __transition_table = {}
+    __seen_states = set()
+    __transition_count = 0
     _, _ = __ast_to_nfa(root=root, index=0)
     # __transition_table[nfa.start] = [(nfa.end, EPSILON)]
 
 
 def __add_transition(from_state: State, to_state: State, char: str) -> None:
-    global __transition_table
+    global __transition_table, __transition_count
     if from_state not in __transition_table:
         __transition_table[from_state] = []
     # print(f"adding transition from {from_state} to {to_state} on {char}")
     __transition_table[from_state].append((to_state, char))
+    if __budget is not None:
+        __seen_states.add(from_state)
+        __seen_states.add(to_state)
+        __transition_count += 1
+        __budget.check_nfa(len(__seen_states), __transition_count)
 
 
 def __update_start_finish(start: State, end: State) -> None:
@@ -112,6 +140,9 @@ def __ast_to_nfa(root: AstNode, index: int = 0) -> Tuple[ThompsonNFA, int]:
         __update_start_finish(start, end)
         # __add_transition(start, end, EPSILON)
         return ThompsonNFA(start, end), index + 2
+    if isinstance(root, GroupAstNode):
+        # the groups only matter to tdfa.py
+        return __ast_to_nfa(root.left, index)
     if isinstance(root, LiteralCharacterAstNode):
         return __literal_character_ast_to_nfa(root.char, index)
     if isinstance(root, OrAstNode):
@@ -0,0 +1,267 @@
+# this file matches huge inputs (e.g multi-GB files) against a byte-level DFA on many cores,
+# the input is split into chunks and since the state a chunk starts in is only known once
+# the chunks before it are scanned, every worker runs its chunk from every state at once
+# (the runs that reach the same state are merged, so it's soon a single scan) and returns
+# the state -> state mapping of its chunk, the mappings are then composed in order,
+# the workers read a file themselves and a buffer is copied once into shared memory
+# usage: python ./parallel.py <REGEX> <FILE> [--workers N] [--chunk-size BYTES]
+
+import argparse
+import mmap
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List
+from compiler import compile_regex
+from matcher import DFATable, ByteDFAMatcher
+from sharedtables import SharedTablePublisher, SharedDFATable, attach, open_block
+from budget import CompileBudget
+
+# how long a warm up task waits for the other workers to take theirs
+__WARM_UP_TIMEOUT = 60.0
+# the barrier of the warm up tasks of this worker's pool, given to it when it starts
+__warm_up_barrier = None
+
+def chunk_mapping(table: DFATable | SharedDFATable, data, start: int = 0, end: int | None = None) -> List[int]:
+    """
+    Runs the (byte-level) table over data[start:end] from all of its states at once.
+
+    Returns:
+        mapping[state] is the state reached from that state at the end of the chunk, or -1 if the DFA died.
+    """
+    byte_classes = table.byte_classes()
+    transitions = table.transitions
+    num_classes = table.num_classes
+    # {current state: the states the runs that reached it started from}
+    runs: Dict[int, List[int]] = {state: [state] for state in range(table.num_states)}
+    with memoryview(data) as view:
+        with view.cast("B")[start:end] as chunk:
+            index = 0
+            while len(runs) > 1 and index < len(chunk):
+                char_class = byte_classes[chunk[index]]
+                merged: Dict[int, List[int]] = {}
+                if char_class >= 0:
+                    for state, origins in runs.items():
+                        next_state = transitions[state * num_classes + char_class]
+                        if next_state >= 0:
+                            merged.setdefault(next_state, []).extend(origins)
+                runs = merged
+                index += 1
+            if len(runs) == 1 and index < len(chunk):
+                # all the live runs converged, the rest is a plain scan
+                ((state, origins),) = runs.items()
+                for byte in chunk[index:]:
+                    char_class = byte_classes[byte]
+                    state = transitions[state * num_classes + char_class] if char_class >= 0 else -1
+                    if state < 0:
+                        break
+                runs = {state: origins} if state >= 0 else {}
+    mapping = [-1] * table.num_states
+    for state, origins in runs.items():
+        for origin in origins:
+            mapping[origin] = state
+    return mapping
+
+
+def compose(first: List[int], second: List[int]) -> List[int]:
+    """
+    Returns the mapping of two consecutive chunks from the mappings of each of them.
+    """
+    return [second[state] if state >= 0 else -1 for state in first]
+
+
+def scan_chunk(table_name: str, data, start: int, end: int | None) -> List[int]:
+    """
+    The work of a worker, the chunk_mapping of data[start:end] with the named shared table
+    (see sharedtables.py), data is the path of the file holding the chunk or the bytes themselves.
+    """
+    table = attach(table_name)
+    if not isinstance(data, str):
+        return chunk_mapping(table, data, start, end)
+    with open(data, "rb") as f:
+        # only the pages of the chunk are read, the offset of a mapping must be page aligned
+        offset = start - start % mmap.ALLOCATIONGRANULARITY
+        with mmap.mmap(f.fileno(), end - offset, access=mmap.ACCESS_READ, offset=offset) as mapped:
+            return chunk_mapping(table, mapped, start - offset, end - offset)
+
+
+def scan_shared_chunk(table_name: str, block_name: str, start: int, end: int) -> List[int]:
+    """
+    Like scan_chunk but the chunk is block[start:end] of the named shared memory block,
+    read in place.
+    """
+    block = open_block(block_name)
+    try:
+        return scan_chunk(table_name, block.buf, start, end)
+    finally:
+        block.close()
+
+
+def init_worker(table_name: str, barrier) -> None:
+    """
+    Runs in every worker of a ParallelScanner as it starts: attaches it to the table
+    and keeps the barrier of the warm up tasks.
+    """
+    global __warm_up_barrier
+    __warm_up_barrier = barrier
+    attach(table_name)
+
+
+def warm_worker(task, table_name: str, source: str, start: int, end: int) -> None:
+    """
+    The warm up task, every worker of the pool has to take one before any of them goes on
+    (so none takes two), then it runs the scan task over its chunk.
+    """
+    __warm_up_barrier.wait(__WARM_UP_TIMEOUT)
+    if start < end:
+        task(table_name, source, start, end)
+
+
+class ParallelScanner:
+    """
+    Args:
+        input_regex: the regex to match, it's compiled byte-level (see compile_regex)
+        and its table is shared with the workers.
+        workers: the number of worker processes, defaults to the number of cores.
+        chunk_size: the bytes scanned by a worker at once.
+        budget: optional limits for compiling the regex.
+    """
+
+    def __init__(self, input_regex: str, workers: int | None = None, chunk_size: int = 16 * 1024 * 1024, budget: CompileBudget | None = None):
+        self.table = DFATable(compile_regex(input_regex, budget=budget, byte_level=True))
+        self.chunk_size = max(1, chunk_size)
+        self.publisher = SharedTablePublisher()
+        self.table_name = self.publisher.publish(self.table)
+        self.workers = workers or os.cpu_count()
+        context = multiprocessing.get_context()
+        self.executor = ProcessPoolExecutor(
+            self.workers, context, initializer=init_worker, initargs=(self.table_name, context.Barrier(self.workers))
+        )
+
+    @contextmanager
+    def __submit(self, data, warm_up: bool = False) -> Iterator[List[Future]]:
+        # one task per chunk (or a warm up task over the first chunk per worker), the workers map the chunks of a file
+        # themselves while a buffer is copied once into a shared memory block they read in place,
+        # the pending tasks are cancelled when leaving, and the block unlinked once no task can read it
+        block = None
+        if isinstance(data, str):
+            size = os.path.getsize(data)
+            task, source = scan_chunk, data
+        else:
+            with memoryview(data) as view, view.cast("B") as view:
+                size = len(view)
+                block = shared_memory.SharedMemory(create=True, size=size) if size else None
+                if block is not None:
+                    block.buf[:size] = view
+            task, source = scan_shared_chunk, block.name if block is not None else ""
+        if warm_up:
+            futures = [
+                self.executor.submit(warm_worker, task, self.table_name, source, 0, min(self.chunk_size, size))
+                for _ in range(self.workers)
+            ]
+        else:
+            futures = [
+                self.executor.submit(task, self.table_name, source, start, min(start + self.chunk_size, size))
+                for start in range(0, size, self.chunk_size)
+            ]
+        try:
+            yield futures
+        finally:
+            for future in futures:
+                future.cancel()
+            if block is not None:
+                wait(futures)
+                block.close()
+                block.unlink()
+
+    def mapping(self, data) -> List[int]:
+        """
+        Returns the state -> state mapping of the whole bytes-like data, or file given its path.
+        """
+        mapping = list(range(self.table.num_states))
+        with self.__submit(data) as futures:
+            for future in futures:
+                mapping = compose(mapping, future.result())
+        return mapping
+
+    def fullmatch(self, data) -> bool:
+        """
+        Tells whether the whole bytes-like data, or file given its path, matches the regex.
+        """
+        with self.__submit(data) as futures:
+            # the mappings are composed in order, from the starting state only
+            state = self.table.start
+            for future in futures:
+                state = future.result()[state]
+                if state < 0:
+                    return False
+        return self.table.accepting[state]
+
+    def warm_up(self, data) -> None:
+        """
+        Starts all the workers, each of them scans the first chunk of data once (they wait for
+        each other so none can take the task of another), so the timings that follow don't count
+        the start of the pool.
+        """
+        with self.__submit(data, warm_up=True) as futures:
+            for future in futures:
+                future.result()
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+        self.publisher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def compare(input_regex: str, path: str, workers: int | None = None, chunk_size: int = 16 * 1024 * 1024) -> Dict[str, float]:
+    """
+    Matches the file sequentially (ByteDFAMatcher over a mmap) then in parallel.
+
+    Returns:
+        {"sequential": seconds, "parallel": seconds, "speedup": ratio, "agree": whether both answered the same}
+    """
+    with ParallelScanner(input_regex, workers, chunk_size) as scanner:
+        matcher = ByteDFAMatcher(scanner.table)
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            if os.path.getsize(path) == 0:
+                sequential = matcher.fullmatch(b"")
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    sequential = matcher.fullmatch(mapped)
+        sequential_time = time.perf_counter() - started
+        scanner.warm_up(path)
+        started = time.perf_counter()
+        parallel = scanner.fullmatch(path)
+        parallel_time = time.perf_counter() - started
+    return {
+        "sequential": sequential_time,
+        "parallel": parallel_time,
+        "speedup": sequential_time / parallel_time,
+        "agree": sequential == parallel,
+        "match": parallel,
+    }
+
+
+def main():
+    args = argparse.ArgumentParser(description="match a huge file against a regex on many cores")
+    args.add_argument("regex", help="the regex the whole file should match")
+    args.add_argument("file", help="the file to match")
+    args.add_argument("--workers", type=int, default=None, help="number of worker processes (default: the number of cores)")
+    args.add_argument("--chunk-size", type=int, default=16 * 1024 * 1024, help="bytes scanned by a worker at once")
+    args = args.parse_args()
+    report = compare(args.regex, args.file, args.workers, args.chunk_size)
+    print(f"match: {report['match']} (sequential agrees: {report['agree']})")
+    print(f"sequential: {report['sequential']:.3f} s, parallel: {report['parallel']:.3f} s, speedup: {report['speedup']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
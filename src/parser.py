@@ -12,13 +12,23 @@ from asttree import (
     QuestionMarkAstNode,
     LiteralCharacterAstNode,
     CharacterClassAstNode,
+    GroupAstNode,
 )
 from typing import Tuple
 
 
 class Parser:
-    def __init__(self, tokens: list[Token]):
+    """
+    Args:
+        tokens: the tokens of the lexer.
+        captures: keep every parenthesized subexpression as a GroupAstNode numbered like python's re does
+        (by the order of their opening parentheses, from 1), instead of dropping the grouping once parsed.
+    """
+
+    def __init__(self, tokens: list[Token], captures: bool = False):
         self.tokens = tokens
+        self.captures = captures
+        self.groups = 0  # the number of capture groups found
 
     def parse(self) -> AstNode:
         return self.__parse(0)[0]
@@ -119,6 +129,9 @@ class Parser:
         if current_token.token_type == TokenType.LITERAL_CHARACTER:
             return (LiteralCharacterAstNode(current_token.value), index)
         if current_token.token_type == TokenType.OPEN_PARENTHESIS:
+            if self.captures:
+                self.groups += 1
+                group = self.groups
             left, index = self.__parse(index)
             rem_tokens = index < len(self.tokens)
             if not rem_tokens:
@@ -126,6 +139,8 @@ class Parser:
             if self.tokens[index].token_type != TokenType.CLOSED_PARENTHESIS:
                 raise Exception()
             index += 1
+            if self.captures:
+                return (GroupAstNode(left, group), index)
             return (left, index)
         if current_token.token_type == TokenType.OPEN_SQUARE_BRACKET:
             left, index = self.__parse_square_bracket(index)
@@ -0,0 +1,217 @@
+# this file analyses the AST (see asttree.py) to find the literals a match can't do without,
+# i.e the strings every match contains (required literals), starts with (prefixes)
+# and the characters every match starts with (first characters), so the search can
+# skip the input with str.find / bytes.find and only run the DFA near candidate positions
+
+from asttree import (
+    AstNode,
+    OrAstNode,
+    SeqAstNode,
+    StarAstNode,
+    PlusAstNode,
+    QuestionMarkAstNode,
+    LiteralCharacterAstNode,
+    CharacterClassAstNode,
+    GroupAstNode,
+)
+from typing import Iterator, List, Set
+
+# the max number of alternative strings tracked for a set of literals
+__MAX_LITERALS = 16
+# the max number of first characters worth finding one by one
+__MAX_FIRST_CHARS = 8
+
+
+class LiteralInfo:
+    """
+    What's known about the strings matched by a subtree, a None field means nothing useful is known.
+
+    Attributes:
+        exact: all the strings matched by the subtree.
+        prefixes: every match starts with one of them.
+        required: every match contains one of them.
+        first_chars: every non-empty match starts with one of them.
+        nullable: whether the subtree matches the empty string.
+    """
+
+    def __init__(
+        self,
+        exact: Set[str] | None,
+        prefixes: Set[str] | None,
+        required: Set[str] | None,
+        first_chars: Set[str] | None,
+        nullable: bool,
+    ):
+        self.exact = exact
+        self.prefixes = prefixes
+        self.required = required
+        self.first_chars = first_chars
+        self.nullable = nullable
+
+
+def __literal_info(
+    exact: Set[str] | None,
+    prefixes: Set[str] | None,
+    required: Set[str] | None,
+    first_chars: Set[str] | None,
+    nullable: bool,
+) -> LiteralInfo:
+    if first_chars is not None and len(first_chars) > __MAX_FIRST_CHARS:
+        first_chars = None
+    return LiteralInfo(exact, __useful(prefixes), __useful(required), first_chars, nullable)
+
+
+def __useful(literals: Set[str] | None) -> Set[str] | None:
+    # a set holding the empty string (or too many strings) tells nothing
+    if literals is None or "" in literals or len(literals) > __MAX_LITERALS:
+        return None
+    return literals
+
+
+def __union(first: Set[str] | None, second: Set[str] | None, limit: int) -> Set[str] | None:
+    if first is None or second is None or len(first) + len(second) > limit:
+        return None
+    return first | second
+
+
+def __cross(first: Set[str] | None, second: Set[str] | None) -> Set[str] | None:
+    if first is None or second is None or len(first) * len(second) > __MAX_LITERALS:
+        return None
+    return {left + right for left in first for right in second}
+
+
+def best_literals(*candidates: Set[str] | None) -> Set[str] | None:
+    """
+    Returns the most selective of the given sets of literals, the longer its shortest literal is,
+    the less often a set is found in the input, but every literal costs one more find.
+    """
+    useful = [literals for literals in map(__useful, candidates) if literals]
+    if not useful:
+        return None
+    return max(useful, key=lambda literals: (min(map(len, literals)) / len(literals), min(map(len, literals))))
+
+
+def __class_chars(node: CharacterClassAstNode, limit: int) -> Set[str] | None:
+    count = sum(1 if isinstance(char, str) else ord(char[1]) - ord(char[0]) + 1 for char in node.char_class)
+    if count > limit:
+        return None
+    chars = set()
+    for char in node.char_class:
+        if isinstance(char, str):
+            chars.add(char)
+        else:
+            chars.update(chr(code) for code in range(ord(char[0]), ord(char[1]) + 1))
+    return chars
+
+
+def analyze(root: AstNode) -> LiteralInfo:
+    """
+    Returns the LiteralInfo of the given AST.
+    """
+    if root is None:
+        return __literal_info({""}, None, None, set(), True)
+    if isinstance(root, GroupAstNode):
+        return analyze(root.left)
+    if isinstance(root, LiteralCharacterAstNode):
+        return __literal_info({root.char}, {root.char}, {root.char}, {root.char}, False)
+    if isinstance(root, CharacterClassAstNode):
+        chars = __class_chars(root, __MAX_LITERALS)
+        return __literal_info(chars, chars, chars, chars, False)
+    if isinstance(root, OrAstNode):
+        left, right = analyze(root.left), analyze(root.right)
+        return __literal_info(
+            __union(left.exact, right.exact, __MAX_LITERALS),
+            __union(left.prefixes, right.prefixes, __MAX_LITERALS),
+            __union(left.required, right.required, __MAX_LITERALS),
+            __union(left.first_chars, right.first_chars, __MAX_FIRST_CHARS),
+            left.nullable or right.nullable,
+        )
+    if isinstance(root, SeqAstNode):
+        left, right = analyze(root.left), analyze(root.right)
+        exact = __cross(left.exact, right.exact)
+        if left.exact is not None:
+            prefixes = best_literals(__cross(left.exact, right.prefixes), left.exact)
+        else:
+            prefixes = left.prefixes
+        first_chars = left.first_chars
+        if left.nullable:
+            first_chars = __union(left.first_chars, right.first_chars, __MAX_FIRST_CHARS)
+        return __literal_info(
+            exact,
+            prefixes,
+            best_literals(exact, prefixes, left.required, right.required),
+            first_chars,
+            left.nullable and right.nullable,
+        )
+    if isinstance(root, PlusAstNode):
+        left = analyze(root.left)
+        return __literal_info(None, left.prefixes, left.required, left.first_chars, left.nullable)
+    if isinstance(root, QuestionMarkAstNode):
+        left = analyze(root.left)
+        exact = None if left.exact is None else left.exact | {""}
+        return __literal_info(exact, None, None, left.first_chars, True)
+    if isinstance(root, StarAstNode):
+        left = analyze(root.left)
+        return __literal_info(None, None, None, left.first_chars, True)
+
+
+class Prefilter:
+    """
+    Tells where a match can start, from the LiteralInfo of the whole regex.
+
+    Args:
+        root: the AST of the regex.
+        byte_level: the input is bytes, so the literals are searched UTF-8 encoded.
+    """
+
+    def __init__(self, root: AstNode, byte_level: bool = False):
+        info = analyze(root)
+        self.nullable = info.nullable
+        self.prefixes = info.prefixes
+        self.required = best_literals(info.required, info.prefixes, info.exact)
+        self.first_chars = info.first_chars
+        if self.nullable:
+            # the empty string matches everywhere
+            self.prefixes = self.required = self.first_chars = None
+        self.byte_level = byte_level
+        if byte_level:
+            self.prefixes = self.__encode(self.prefixes)
+            self.required = self.__encode(self.required)
+            # a multi-byte first character would be found by its first byte only
+            if self.first_chars is not None:
+                self.first_chars = {char.encode("utf-8")[:1] for char in self.first_chars}
+
+    @staticmethod
+    def __encode(literals: Set[str] | None) -> Set[bytes] | None:
+        return None if literals is None else {literal.encode("utf-8") for literal in literals}
+
+    def last_start(self, text, pos: int = 0) -> int:
+        """
+        Returns the last position a match can start at, as every match contains one of the required literals
+        it can't start after the last one of them, -1 if none of them is in text[pos:].
+        """
+        if self.required is None:
+            return len(text)
+        return max(text.rfind(literal, pos) for literal in self.required)
+
+    def candidates(self, text, pos: int = 0) -> Iterator[int]:
+        """
+        Yields in increasing order the positions a match may start at,
+        by finding the prefixes or the first characters if any, else every position.
+        """
+        last = self.last_start(text, pos)
+        needles = self.prefixes or self.first_chars
+        if needles is None:
+            yield from range(pos, last + 1)
+            return
+        # the next position of every needle, found lazily with str.find
+        next_positions: List[List] = [[text.find(needle, pos), needle] for needle in needles]
+        while True:
+            next_positions = [entry for entry in next_positions if 0 <= entry[0] <= last]
+            if not next_positions:
+                return
+            position = min(entry[0] for entry in next_positions)
+            yield position
+            for entry in next_positions:
+                if entry[0] == position:
+                    entry[0] = text.find(entry[1], position + 1)
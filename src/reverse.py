@@ -0,0 +1,99 @@
+# this file runs a (minimized) DFA backwards over the input: LiveStates reverses the edges of the
+# forward DFA and determinizes that reversed automaton lazily, one set of forward states at a time,
+# while it walks the input from its end (in place, nothing is copied), its state at a position is the
+# set of forward states from which the rest of the input still reaches an accepting state, so it
+# tells both where the matches start (the forward starting state is live there) and where a forward
+# scan can stop since no longer match is possible (see search.py)
+
+from array import array
+from typing import Dict, Iterator, List, Tuple
+from matcher import DFATable
+
+
+def classes_backwards(text, pos: int, class_map: Dict[str, int], byte_classes: List[int] | None = None) -> Iterator[Tuple[int, int]]:
+    """
+    Yields (index, class) from the end of the text down to pos, walking it in place (nothing is copied),
+    the class is -1 for the characters out of the class map.
+
+    Args:
+        byte_classes: the class of every byte when the text is bytes-like, None for a str.
+    """
+    if byte_classes is None:
+        for index in range(len(text) - 1, pos - 1, -1):
+            yield index, class_map.get(text[index], -1)
+        return
+    with memoryview(text) as view, view.cast("B") as symbols:
+        for index in range(len(symbols) - 1, pos - 1, -1):
+            yield index, byte_classes[symbols[index]]
+
+
+class LiveStates:
+    """
+    The forward DFATable with its edges reversed, determinized lazily while it runs backwards:
+    its states are sets of forward states (bit masks), the one at a position holds the forward
+    states from which the rest of the input reaches an accepting state. Run over a text, a match
+    starts at a position iff the forward starting state is live there, and a forward scan can stop
+    as soon as its state isn't live anymore as no longer match can follow.
+
+    Args:
+        table: the DFATable of the forward (minimized) DFA.
+        byte_level: the input is bytes-like (the table is compiled with byte_level=True).
+    """
+
+    def __init__(self, table: DFATable, byte_level: bool = False):
+        self.table = table
+        self.byte_level = byte_level
+        self.byte_classes = table.byte_classes()
+        num_classes = table.num_classes
+        # predecessors[class][state] is the mask of the states going to state on that class
+        self.predecessors: List[List[int]] = [[0] * table.num_states for _ in range(num_classes)]
+        for state in range(table.num_states):
+            for char_class in range(num_classes):
+                next_state = table.transitions[state * num_classes + char_class]
+                if next_state >= 0:
+                    self.predecessors[char_class][next_state] |= 1 << state
+        self.accepting_mask = sum(1 << state for state in range(table.num_states) if table.accepting[state])
+        # the interned masks, and the lazily built transitions {(mask id, class): mask id}
+        self.masks: List[int] = []
+        self.mask_ids: Dict[int, int] = {}
+        self.moves: Dict[Tuple[int, int], int] = {}
+        self.__intern(self.accepting_mask)
+
+    def __intern(self, mask: int) -> int:
+        mask_id = self.mask_ids.get(mask)
+        if mask_id is None:
+            mask_id = self.mask_ids[mask] = len(self.masks)
+            self.masks.append(mask)
+        return mask_id
+
+    def __move(self, mask_id: int, char_class: int) -> int:
+        # the forward states live before the character: the accepting ones, and the ones
+        # going on it to a state live after it
+        mask = self.accepting_mask
+        if char_class >= 0:
+            predecessors = self.predecessors[char_class]
+            live = self.masks[mask_id]
+            state = 0
+            while live:
+                if live & 1:
+                    mask |= predecessors[state]
+                live >>= 1
+                state += 1
+        next_id = self.moves[(mask_id, char_class)] = self.__intern(mask)
+        return next_id
+
+    def scan(self, text, pos: int = 0) -> array:
+        """
+        Runs backwards over text[pos:] in one pass.
+
+        Returns:
+            live[index - pos] is the id of the mask of the live states at index (in masks), for pos <= index <= len(text).
+        """
+        live = array("i", [0]) * (len(text) - pos + 1)  # nothing follows the end so only the accepting states are live
+        moves = self.moves
+        mask_id = 0
+        for index, char_class in classes_backwards(text, pos, self.table.class_map, self.byte_classes if self.byte_level else None):
+            next_id = moves.get((mask_id, char_class))
+            mask_id = self.__move(mask_id, char_class) if next_id is None else next_id
+            live[index - pos] = mask_id
+        return live
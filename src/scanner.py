@@ -0,0 +1,150 @@
+# this file generates a maximal-munch scanner out of an ordered list of (token_name, regex) rules,
+# all the rules are compiled into one DFA whose accepting states carry the rule
+# with the highest priority (the first one in the list) among the rules they accept,
+# then the input is tokenized in a single pass taking the longest match at every position
+
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from nfa import State, EPSILON
+from dfa import DFAClean, build_powerset
+from fragment import IncrementalCompiler, NFAFragment, materialize
+from matcher import DFATable
+from budget import CompileBudget
+
+
+class Lexeme:
+    def __init__(self, name: str, value: str, start: int, end: int):
+        self.name = name
+        self.value = value
+        self.start = start
+        self.end = end
+
+    def __str__(self):
+        return f"<{self.name}, {self.value!r}>"
+
+    def __repr__(self):
+        return f"<{self.name}, {self.value!r}>"
+
+
+class ScanError(Exception):
+    """
+    Raised when no rule matches (a non-empty string) at the given position of the input.
+    """
+
+    def __init__(self, position: int):
+        self.position = position
+        super().__init__(f"no rule matches at position {position}")
+
+
+class Scanner:
+    """
+    Args:
+        rules: the (token_name, regex) rules, the earlier a rule is the higher its priority is
+        when two rules match the same longest string.
+        skip: names of the tokens to drop instead of yielding them (e.g whitespace).
+        budget: optional limits for compiling the rules.
+    """
+
+    def __init__(self, rules: List[Tuple[str, str]], skip: Iterable[str] = (), budget: CompileBudget | None = None):
+        self.names = [name for name, _ in rules]
+        self.skip = set(skip)
+
+        # the deadline bounds the build of the whole scanner, not of every rule
+        if budget is not None:
+            budget.start()
+        # one new starting state (0) with an epsilon to every rule
+        compiler = IncrementalCompiler(verbose=True, budget=budget)
+        fragments = [compiler.build_fragment(regex, start_budget=False) for _, regex in rules]
+        offsets = []
+        size = 1
+        for fragment in fragments:
+            offsets.append(size)
+            size += fragment.size
+        edges = tuple((0, offset + fragment.start, EPSILON) for fragment, offset in zip(fragments, offsets))
+        combined = NFAFragment(size, 0, 0, edges, tuple(zip(fragments, offsets)))
+        if budget is not None:
+            budget.check_nfa(combined.size, combined.edge_count)
+        nfa, starting_state, _ = materialize(combined)
+        rule_ends = {State(f"S{offset + fragment.end}"): rule for rule, (fragment, offset) in enumerate(zip(fragments, offsets))}
+
+        # the accepting states are tagged afterwards, from the NFA states of every superstate
+        dfa = build_powerset(starting_state, State(None), nfa, budget)
+        superstate_labels = {superstate: State(f"S{index}") for index, superstate in enumerate(dfa.all_states)}
+        transitions: Dict[State, Set[Tuple[State, str]]] = {}
+        for superstate, superstate_transitions in dfa.transitions.items():
+            transitions[superstate_labels[superstate]] = {
+                (superstate_labels[next_superstate], char) for next_superstate, char in superstate_transitions
+            }
+        rules_of_states: Dict[State, int] = {}
+        for superstate, state in superstate_labels.items():
+            accepted = [rule_ends[nfa_state] for nfa_state in superstate if nfa_state in rule_ends]
+            if accepted:
+                rules_of_states[state] = min(accepted)
+        self.table = DFATable(
+            DFAClean(
+                superstate_labels[dfa.starting_state],
+                list(rules_of_states),
+                transitions,
+                set(superstate_labels.values()),
+            )
+        )
+        # rules[state] is the rule accepted in that state or -1
+        self.rules: List[int] = [rules_of_states.get(State(label), -1) for label in self.table.state_labels]
+
+    def tokenize(self, text: str) -> Iterator[Lexeme]:
+        """
+        Lazily yields the tokens of the text, raises a ScanError where no rule matches.
+        """
+        return self.tokenize_stream([text])
+
+    def tokenize_stream(self, chunks: Iterable[str]) -> Iterator[Lexeme]:
+        """
+        Lazily yields the tokens of a stream of text chunks (e.g a file opened in text mode),
+        a token may span many chunks, the text already tokenized is dropped whenever a chunk is read.
+        """
+        class_map = self.table.class_map
+        transitions = self.table.transitions
+        num_classes = self.table.num_classes
+        rules = self.rules
+        chunks = iter(chunks)
+        buffer = ""
+        position = 0  # where the current token starts in the buffer
+        offset = 0  # the position of buffer[0] in the whole input
+        exhausted = False
+        while True:
+            # run the DFA from the start of the token as far as it goes,
+            # remembering the last accepting position to backtrack to it
+            state = self.table.start
+            last_rule, last_end = -1, position
+            index = position
+            while True:
+                if index == len(buffer):
+                    if exhausted:
+                        break
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    # drop the text of the tokens already yielded
+                    buffer = buffer[position:] + chunk
+                    offset += position
+                    index -= position
+                    last_end -= position
+                    position = 0
+                    continue
+                char_class = class_map.get(buffer[index])
+                if char_class is None:
+                    break
+                state = transitions[state * num_classes + char_class]
+                if state < 0:
+                    break
+                index += 1
+                if rules[state] >= 0:
+                    last_rule, last_end = rules[state], index
+            if last_rule < 0:
+                if exhausted and position == len(buffer):
+                    return
+                raise ScanError(offset + position)
+            name = self.names[last_rule]
+            if name not in self.skip:
+                yield Lexeme(name, buffer[position:last_end], offset + position, offset + last_end)
+            position = last_end
@@ -0,0 +1,124 @@
+# this file searches the input for the (leftmost-longest) matches of a regex,
+# the prefilter (see prefilter.py) skips the input that can't hold a match
+# and the DFA only runs forward from the candidate positions it finds, if these scans read too much
+# in vain (candidates failing, or scans going on past the end of their match as a longer one
+# might follow), one backward pass of reverse.LiveStates finds all the match starts and lets
+# every forward scan stop right after the end of its match, so all the matches are found in linear time
+
+from contextlib import nullcontext
+from array import array
+from typing import Iterator, Tuple
+from lexer import Lexer
+from parser import Parser
+from compiler import compile_regex
+from matcher import DFATable
+from prefilter import Prefilter
+from reverse import LiveStates
+from budget import CompileBudget
+
+
+class Searcher:
+    """
+    Args:
+        input_regex: the regex to search for.
+        byte_level: search bytes-like inputs (bytes, mmap, ...) instead of str,
+        the spans are then byte offsets.
+        budget: optional limits for compiling the regex.
+    """
+
+    # the characters the forward scans may read in vain (past the end of their match, or for a failing
+    # candidate) per character of input before the backward pass runs, it reads every character once
+    max_wasted_ratio = 1.0
+
+    def __init__(self, input_regex: str, byte_level: bool = False, budget: CompileBudget | None = None):
+        ast = Parser(Lexer(input_regex).tokenize()).parse()
+        self.input_regex = input_regex
+        self.byte_level = byte_level
+        self.prefilter = Prefilter(ast, byte_level)
+        self.table = DFATable(compile_regex(input_regex, verbose=True, budget=budget, byte_level=byte_level))
+        # {symbol: class}, the symbols of a bytes-like input are the byte values
+        self.classes = self.table.class_map
+        if byte_level:
+            self.classes = {byte: char_class for byte, char_class in enumerate(self.table.byte_classes()) if char_class >= 0}
+        # built on the first time it's needed
+        self.live_states: LiveStates | None = None
+
+    def __scan(self, text, start: int, live: array | None = None, live_pos: int = 0) -> Tuple[int, int]:
+        # runs the DFA forward from start, until it dies or, given the live states of the positions
+        # from live_pos on, until no accepting state can be reached anymore
+        # returns (the end of the longest match or -1, the position it stopped at)
+        transitions = self.table.transitions
+        num_classes = self.table.num_classes
+        accepting = self.table.accepting
+        classes = self.classes
+        masks = None if live is None else self.live_states.masks
+        state = self.table.start
+        end = start if accepting[state] else -1
+        index = start
+        with memoryview(text) if self.byte_level else nullcontext(text) as view:
+            symbols = view.cast("B") if self.byte_level else view
+            length = len(symbols)
+            while index < length:
+                char_class = classes.get(symbols[index], -1)
+                if char_class < 0:
+                    break
+                state = transitions[state * num_classes + char_class]
+                if state < 0:
+                    break
+                index += 1
+                if masks is not None and not masks[live[index - live_pos]] >> state & 1:
+                    break
+                if accepting[state]:
+                    end = index
+        return end, index
+
+    def __spans(self, text, pos: int) -> Iterator[Tuple[int, int]]:
+        live: array | None = None  # the live states of the positions from live_pos on, once the backward pass ran
+        live_pos = pos
+        wasted = 0
+        max_wasted = self.max_wasted_ratio * len(text) + 64
+        while pos <= len(text):
+            if live is None and wasted > max_wasted:
+                if self.live_states is None:
+                    self.live_states = LiveStates(self.table, self.byte_level)
+                live, live_pos = self.live_states.scan(text, pos), pos
+            if live is None:
+                for start in self.prefilter.candidates(text, pos):
+                    end, stop = self.__scan(text, start)
+                    wasted += stop - max(start, end)
+                    if end >= 0:
+                        span = (start, end)
+                        break
+                    if wasted > max_wasted:
+                        span = None
+                        pos = start + 1  # no match starts before that
+                        break
+                else:
+                    return
+                if span is None:
+                    continue
+            else:
+                masks = self.live_states.masks
+                bit = 1 << self.table.start
+                start = pos
+                while start <= len(text) and not masks[live[start - live_pos]] & bit:
+                    start += 1
+                if start > len(text):
+                    return
+                span = (start, self.__scan(text, start, live, live_pos)[0])
+            yield span
+            # an empty match would be found again at the same position
+            pos = span[1] if span[1] > span[0] else span[1] + 1
+
+    def search(self, text, pos: int = 0) -> Tuple[int, int] | None:
+        """
+        Returns the (start, end) span of the leftmost-longest match in text[pos:], or None.
+        """
+        return next(self.__spans(text, pos), None)
+
+    def finditer(self, text) -> Iterator[Tuple[int, int]]:
+        """
+        Lazily yields the spans of all the non-overlapping matches, from left to right,
+        in time linear in the length of the text.
+        """
+        return self.__spans(text, 0)
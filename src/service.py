@@ -0,0 +1,360 @@
+# this file serves the compile / match pipeline from one warm process over a unix socket
+# or localhost TCP, so clients pay neither the interpreter startup nor the recompilation,
+# the protocol is one JSON object per line both ways:
+#   {"id": 1, "op": "match", "regex": "(a|b)*", "text": "abab"} -> {"id": 1, "ok": true, "match": true}
+#   {"id": 2, "op": "compile", "regex": "(a|b)*"} -> {"id": 2, "ok": true, "states": 1, "cached": true}
+#   {"id": 3, "op": "metrics"} -> {"id": 3, "ok": true, "metrics": {...}}
+#   errors -> {"id": ..., "ok": false, "error": "..."}
+# usage: python ./service.py (--unix PATH | --port PORT) [--max-dfa-states N] [--deadline SECONDS]
+
+import argparse
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Set, Tuple
+from compiler import compile_regex
+from dfa import DFAClean
+from matcher import DFATable, DFAMatcher, NFAMatcher
+from budget import CompileBudget
+
+# the max size of a request line
+LINE_LIMIT = 16 * 1024 * 1024
+
+
+def percentiles(values: Deque[float]) -> Dict[str, float]:
+    """
+    Returns the count and the p50 / p90 / p99 / max of the given latencies (seconds) in milliseconds.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {"count": len(ordered), "p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99), "max": ordered[-1] * 1000}
+
+
+class MatchService:
+    """
+    The compiled patterns are cached (least recently used ones are evicted), the compilation
+    runs on a single worker thread since the NFA construction (nfa.py) works on module globals,
+    and the concurrent match requests of the same pattern are answered by one batched call
+    run on another worker thread, so a batch of big texts doesn't block the event loop.
+
+    Args:
+        max_cached: max number of compiled patterns kept.
+        batch_window: seconds a match request waits for others of the same pattern.
+        max_batch: a batch is run right away once it holds that many texts.
+        max_nfa_states, max_dfa_states, max_transitions, deadline: the CompileBudget of every compilation,
+        a pattern going over the DFA limits is matched by simulating its NFA instead.
+    """
+
+    def __init__(
+        self,
+        max_cached: int = 256,
+        batch_window: float = 0.001,
+        max_batch: int = 256,
+        max_nfa_states: int | None = None,
+        max_dfa_states: int | None = None,
+        max_transitions: int | None = None,
+        deadline: float | None = None,
+    ):
+        self.max_cached = max_cached
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.budget_limits = (max_nfa_states, max_dfa_states, max_transitions, deadline)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compiler")
+        self.match_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="matcher")
+        self.running: Set[asyncio.Task] = set()  # the batches being matched
+        self.cache: OrderedDict[str, DFAMatcher | NFAMatcher] = OrderedDict()
+        self.compiling: Dict[str, asyncio.Future] = {}
+        # {regex: (matcher, [(text, future), ...])} of the batches waiting to run
+        self.batches: Dict[str, Tuple[DFAMatcher | NFAMatcher, List[Tuple[str, asyncio.Future]]]] = {}
+
+        self.started = time.monotonic()
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.counters: Dict[str, int] = {
+            "requests": 0,
+            "errors": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "batches": 0,
+            "batched_texts": 0,
+            "max_queue_depth": 0,
+        }
+
+    def queue_depth(self) -> int:
+        """
+        Returns the number of requests waiting, i.e the texts in pending batches and the patterns being compiled.
+        """
+        return sum(len(items) for _, items in self.batches.values()) + len(self.compiling)
+
+    def __track_queue_depth(self) -> None:
+        self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self.queue_depth())
+
+    def __compile_sync(self, regex: str) -> DFAMatcher | NFAMatcher:
+        budget = CompileBudget(*self.budget_limits)
+        compiled = compile_regex(regex, verbose=True, budget=budget, fallback_to_nfa=True)
+        if isinstance(compiled, DFAClean):
+            return DFAMatcher(DFATable(compiled))
+        return compiled
+
+    async def compile(self, regex: str) -> DFAMatcher | NFAMatcher:
+        """
+        Returns the matcher of the regex, from the cache or compiled on the worker thread,
+        concurrent requests for the same regex share one compilation.
+        """
+        if regex in self.cache:
+            self.counters["cache_hits"] += 1
+            self.cache.move_to_end(regex)
+            return self.cache[regex]
+        if regex in self.compiling:
+            self.counters["cache_hits"] += 1
+            return await asyncio.shield(self.compiling[regex])
+        self.counters["cache_misses"] += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self.__compile_sync, regex)
+        self.compiling[regex] = future
+        self.__track_queue_depth()
+        try:
+            matcher = await asyncio.shield(future)
+        finally:
+            self.compiling.pop(regex, None)
+        self.cache[regex] = matcher
+        while len(self.cache) > self.max_cached:
+            self.cache.popitem(last=False)
+        return matcher
+
+    @staticmethod
+    def __fullmatch_all(matcher: DFAMatcher | NFAMatcher, texts: List[str]) -> List[bool | Exception]:
+        # runs on the matcher thread, an error only fails its own text
+        results: List[bool | Exception] = []
+        for text in texts:
+            try:
+                results.append(matcher.fullmatch(text))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def __match_batch(self, matcher: DFAMatcher | NFAMatcher, items: List[Tuple[str, asyncio.Future]]) -> None:
+        items = [(text, future) for text, future in items if not future.done()]  # the others' clients went away
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.match_executor, self.__fullmatch_all, matcher, [text for text, _ in items]
+            )
+        except Exception as e:
+            results = [e] * len(items)
+        for (_, future), result in zip(items, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def __run_batch(self, regex: str) -> None:
+        if regex not in self.batches:
+            return  # already run, it was full before its window ended
+        matcher, items = self.batches.pop(regex)
+        self.counters["batches"] += 1
+        self.counters["batched_texts"] += len(items)
+        task = asyncio.ensure_future(self.__match_batch(matcher, items))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def match(self, regex: str, text: str) -> bool:
+        """
+        Tells whether the whole text matches the regex, the text joins the pending batch of the regex.
+        """
+        if not isinstance(regex, str) or not isinstance(text, str):
+            raise Exception("the regex and the text should be strings")
+        matcher = await self.compile(regex)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if regex not in self.batches:
+            self.batches[regex] = (matcher, [])
+            loop.call_later(self.batch_window, self.__run_batch, regex)
+        items = self.batches[regex][1]
+        items.append((text, future))
+        self.__track_queue_depth()
+        if len(items) >= self.max_batch:
+            self.__run_batch(regex)
+        return await future
+
+    def metrics(self) -> Dict:
+        return {
+            "uptime": time.monotonic() - self.started,
+            "queue_depth": self.queue_depth(),
+            "cached_patterns": len(self.cache),
+            "average_batch": self.counters["batched_texts"] / max(self.counters["batches"], 1),
+            "latency_ms": {op: percentiles(latencies) for op, latencies in self.latencies.items()},
+            **self.counters,
+        }
+
+    async def handle_request(self, request: Dict) -> Dict:
+        """
+        Answers one decoded request, this is what the connections call for every line,
+        so the service can be driven directly without any socket.
+        """
+        started = time.perf_counter()
+        op = request.get("op") if isinstance(request, dict) else None
+        response: Dict = {"id": request.get("id")} if isinstance(request, dict) else {"id": None}
+        self.counters["requests"] += 1
+        try:
+            if op == "match":
+                response["match"] = await self.match(request["regex"], request["text"])
+            elif op == "compile":
+                cached = request["regex"] in self.cache
+                matcher = await self.compile(request["regex"])
+                response["cached"] = cached
+                response["states"] = matcher.table.num_states if isinstance(matcher, DFAMatcher) else None
+            elif op == "metrics":
+                response["metrics"] = self.metrics()
+            else:
+                raise Exception(f"unknown op {op!r}, expected one of 'match', 'compile', 'metrics'")
+            response["ok"] = True
+        except KeyError as e:
+            self.counters["errors"] += 1
+            response.update(ok=False, error=f"missing field {e}")
+        except Exception as e:
+            self.counters["errors"] += 1
+            response.update(ok=False, error=str(e) or type(e).__name__)
+        op = op if op in ("match", "compile", "metrics") else "invalid"
+        self.latencies.setdefault(op, deque(maxlen=4096)).append(time.perf_counter() - started)
+        return response
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # the requests of a connection run concurrently (so they can be batched together),
+        # the responses are written as they're ready and carry the id of their request
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(line: bytes):
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"id": None, "ok": False, "error": f"invalid JSON: {e}"}
+            else:
+                response = await self.handle_request(request)
+            async with write_lock:
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(respond(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            # the connection is broken or too long a line came, the pending responses can't be written anymore
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve_unix(self, path: str) -> asyncio.AbstractServer:
+        return await asyncio.start_unix_server(self.handle_connection, path, limit=LINE_LIMIT)
+
+    async def serve_tcp(self, port: int, host: str = "127.0.0.1") -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle_connection, host, port, limit=LINE_LIMIT)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.match_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ServiceClient:
+    """
+    A minimal client pipelining requests over one connection, the responses are matched to their requests by id.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.receiver = asyncio.create_task(self.__receive())
+
+    @classmethod
+    async def connect_unix(cls, path: str) -> "ServiceClient":
+        return cls(*await asyncio.open_unix_connection(path, limit=LINE_LIMIT))
+
+    @classmethod
+    async def connect_tcp(cls, port: int, host: str = "127.0.0.1") -> "ServiceClient":
+        return cls(*await asyncio.open_connection(host, port, limit=LINE_LIMIT))
+
+    async def __receive(self) -> None:
+        try:
+            while line := await self.reader.readline():
+                response = json.loads(line)
+                future = self.pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            # the requests still waiting fail, the ones their caller cancelled (e.g on a timeout) are done already
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("the service closed the connection"))
+            self.pending.clear()
+
+    async def request(self, op: str, **fields) -> Dict:
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.next_id] = future
+        self.writer.write(json.dumps({"id": self.next_id, "op": op, **fields}).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def match(self, regex: str, text: str) -> bool:
+        response = await self.request("match", regex=regex, text=text)
+        if not response["ok"]:
+            raise Exception(response["error"])
+        return response["match"]
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+
+async def serve(args) -> None:
+    service = MatchService(
+        max_cached=args.max_cached,
+        batch_window=args.batch_window,
+        max_dfa_states=args.max_dfa_states,
+        deadline=args.deadline,
+    )
+    server = await (service.serve_unix(args.unix) if args.unix else service.serve_tcp(args.port))
+    print(f"serving on {args.unix or f'127.0.0.1:{args.port}'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main():
+    args = argparse.ArgumentParser(description="serve regex compilation and matching over a local socket")
+    where = args.add_mutually_exclusive_group(required=True)
+    where.add_argument("--unix", default=None, help="path of the unix socket to listen on")
+    where.add_argument("--port", type=int, default=None, help="localhost TCP port to listen on")
+    args.add_argument("--max-cached", type=int, default=256, help="max number of compiled patterns kept")
+    args.add_argument("--batch-window", type=float, default=0.001, help="seconds a match waits to be batched")
+    args.add_argument("--max-dfa-states", type=int, default=10000, help="max DFA states before matching with the NFA")
+    args.add_argument("--deadline", type=float, default=None, help="max number of seconds to compile a pattern")
+    args = args.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
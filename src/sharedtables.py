@@ -0,0 +1,253 @@
+# this file publishes the flat tables of a DFATable (see matcher.py) into multiprocessing.shared_memory
+# so the workers of a process pool match against one copy of every automaton instead of
+# recompiling or unpickling their own, a worker attaches by the name of the block and gets
+# read-only memoryviews over it (no copy), the process that published it owns it and unlinks it
+#
+# the layout of a block (native byte order, int32 unless said otherwise):
+#   header: magic, version, num_states, num_classes, start, number of class ranges
+#   transitions: num_states * num_classes, row-major, -1 for no transition
+#   accepting: num_states bytes (bools)
+#   low classes: the class of every code point < 256 (i.e every byte) or -1
+#   class ranges: the code points >= 256 as sorted [first, last] ranges and their classes
+
+import struct
+from bisect import bisect_right
+from multiprocessing import shared_memory, util
+from typing import Dict, List, Tuple
+from matcher import DFATable, DFAMatcher, ByteDFAMatcher
+
+__HEADER = struct.Struct("=4sIIIiI")
+__MAGIC = b"RDFA"
+__VERSION = 1
+__INT = struct.calcsize("=i")
+
+
+def __class_ranges(class_map: Dict[str, int]) -> Tuple[List[int], List[Tuple[int, int, int]]]:
+    low_classes = [-1] * 256
+    ranges: List[Tuple[int, int, int]] = []
+    for char, char_class in sorted(class_map.items()):
+        code = ord(char)
+        if code < 256:
+            low_classes[code] = char_class
+        elif ranges and ranges[-1][1] == code - 1 and ranges[-1][2] == char_class:
+            ranges[-1] = (ranges[-1][0], code, char_class)
+        else:
+            ranges.append((code, code, char_class))
+    return low_classes, ranges
+
+
+def __layout(num_states: int, num_classes: int, num_ranges: int) -> Dict[str, Tuple[int, int]]:
+    # {section: (offset, length in bytes)}, the int sections are aligned
+    sections = {}
+    offset = __HEADER.size
+    for name, length in (
+        ("transitions", num_states * num_classes * __INT),
+        ("accepting", num_states),
+        ("low_classes", 256 * __INT),
+        ("range_firsts", num_ranges * __INT),
+        ("range_lasts", num_ranges * __INT),
+        ("range_classes", num_ranges * __INT),
+    ):
+        offset = (offset + __INT - 1) // __INT * __INT
+        sections[name] = (offset, length)
+        offset += length
+    sections["total"] = (0, offset)
+    return sections
+
+
+def pack_table(table: DFATable) -> bytes:
+    """
+    Returns the bytes of the block holding the given table.
+    """
+    low_classes, ranges = __class_ranges(table.class_map)
+    sections = __layout(table.num_states, table.num_classes, len(ranges))
+    data = bytearray(sections["total"][1])
+    __HEADER.pack_into(data, 0, __MAGIC, __VERSION, table.num_states, table.num_classes, table.start, len(ranges))
+    for name, values, fmt in (
+        ("transitions", table.transitions, "i"),
+        ("accepting", table.accepting, "?"),
+        ("low_classes", low_classes, "i"),
+        ("range_firsts", [first for first, _, _ in ranges], "i"),
+        ("range_lasts", [last for _, last, _ in ranges], "i"),
+        ("range_classes", [char_class for _, _, char_class in ranges], "i"),
+    ):
+        offset, _ = sections[name]
+        struct.pack_into(f"={len(values)}{fmt}", data, offset, *values)
+    return bytes(data)
+
+
+def unpack_header(buffer) -> Tuple[int, int, int, Dict[str, Tuple[int, int]]]:
+    """
+    Returns (num_states, num_classes, start, {section: (offset, length)}) of the given block.
+    """
+    magic, version, num_states, num_classes, start, num_ranges = __HEADER.unpack_from(buffer, 0)
+    if magic != __MAGIC or version != __VERSION:
+        raise Exception(f"the block doesn't hold a DFA table (version {__VERSION})")
+    return num_states, num_classes, start, __layout(num_states, num_classes, num_ranges)
+
+
+def open_block(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to the named shared memory block without owning it.
+    """
+    # only the publisher should unlink the block, python 3.13+ can be told not to track it,
+    # before that the resource tracker registers it again but it's the same tracker for the
+    # workers forked / spawned by the publisher, so nothing is unlinked when they exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedClassMap:
+    """
+    A read-only {char: class} mapping over the class sections of a block,
+    it has the get method the matchers use on DFATable.class_map.
+    """
+
+    def __init__(self, low_classes: memoryview, firsts: memoryview, lasts: memoryview, classes: memoryview):
+        self.low_classes = low_classes
+        self.firsts = firsts
+        self.lasts = lasts
+        self.classes = classes
+
+    def get(self, char: str, default=None):
+        code = ord(char)
+        if code < 256:
+            char_class = self.low_classes[code]
+            return default if char_class < 0 else char_class
+        index = bisect_right(self.firsts, code) - 1
+        if index >= 0 and code <= self.lasts[index]:
+            return self.classes[index]
+        return default
+
+    def __contains__(self, char: str) -> bool:
+        return self.get(char) is not None
+
+
+class SharedDFATable:
+    """
+    A DFATable attached to a published block, its arrays are read-only memoryviews over the
+    shared memory so it can be handed to DFAMatcher / ByteDFAMatcher like a DFATable.
+
+    Args:
+        name: the name of the block (SharedTablePublisher.publish returns it).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.shm = open_block(name)
+        buffer = self.shm.buf.toreadonly()
+        try:
+            self.num_states, self.num_classes, self.start, sections = unpack_header(buffer)
+        except Exception:
+            buffer.release()
+            self.shm.close()
+            raise
+        self.views: List[memoryview] = [buffer]
+
+        def view(section: str, fmt: str) -> memoryview:
+            offset, length = sections[section]
+            self.views.append(buffer[offset : offset + length].cast(fmt))
+            return self.views[-1]
+
+        self.transitions = view("transitions", "i")
+        self.accepting = view("accepting", "?")
+        self.class_map = SharedClassMap(
+            view("low_classes", "i"), view("range_firsts", "i"), view("range_lasts", "i"), view("range_classes", "i")
+        )
+        self.__byte_classes: List[int] | None = None
+
+    def byte_classes(self) -> List[int]:
+        """
+        Like DFATable.byte_classes, a list copy of the low classes section (indexing it is faster).
+        """
+        if self.__byte_classes is None:
+            self.__byte_classes = self.class_map.low_classes.tolist()
+        return self.__byte_classes
+
+    def close(self) -> None:
+        """
+        Detaches from the block, the matchers using this table can't be used anymore.
+        """
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.shm.close()
+
+
+class SharedTablePublisher:
+    """
+    Owns the shared memory blocks of the published tables, they're unlinked on close()
+    (or when leaving the with block), after which no new worker can attach to them.
+    """
+
+    def __init__(self):
+        self.blocks: Dict[str, shared_memory.SharedMemory] = {}
+
+    def publish(self, table: DFATable) -> str:
+        """
+        Copies the table into a new shared memory block.
+
+        Returns:
+            the name of the block, the workers attach to it with attach(name).
+        """
+        data = pack_table(table)
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        shm.buf[: len(data)] = data
+        self.blocks[shm.name] = shm
+        return shm.name
+
+    def unpublish(self, name: str) -> None:
+        shm = self.blocks.pop(name)
+        shm.close()
+        shm.unlink()
+
+    def close(self) -> None:
+        for name in list(self.blocks):
+            self.unpublish(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+# the tables this process attached to, by block name
+__attached: Dict[str, SharedDFATable] = {}
+
+
+def attach(name: str) -> SharedDFATable:
+    """
+    Returns the table of the named block, attached once per process and then reused,
+    so a pool task can call it every time it runs.
+    """
+    if not __attached:
+        # the views must be released before the blocks are closed at exit, pool workers
+        # skip atexit but run the multiprocessing finalizers (as does the main process)
+        util.Finalize(None, detach_all, exitpriority=10)
+    if name not in __attached:
+        __attached[name] = SharedDFATable(name)
+    return __attached[name]
+
+
+def detach_all() -> None:
+    """
+    Detaches this process from all the tables it attached to.
+    """
+    for table in __attached.values():
+        table.close()
+    __attached.clear()
+
+
+def shared_matcher(name: str, byte_level: bool = False) -> DFAMatcher | ByteDFAMatcher:
+    """
+    Returns a matcher running over the named shared table, the table must come from
+    compile_regex(..., byte_level=True) to match bytes-like inputs.
+    """
+    table = attach(name)
+    return ByteDFAMatcher(table) if byte_level else DFAMatcher(table)
@@ -0,0 +1,242 @@
+# this file compresses the transitions of a DFATable (see matcher.py), most rows of a minimized DFA
+# have a few transitions only, so a dense states x classes table wastes most of its memory,
+#   comb: the rows are overlapped into one vector (row displacement), a check vector tells the owner of every slot
+#   hybrid: every state gets a dense row or a sorted list of class ranges searched with bisect, by its density
+# usage: python ./sparse.py <REGEX> [--max-sparse-density D]
+
+import argparse
+import time
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, List, Tuple
+from compiler import compile_regex
+from matcher import DFATable
+
+
+def row_runs(row: List[int]) -> List[Tuple[int, int, int]]:
+    """
+    Returns the (first_class, last_class, next_state) runs of consecutive classes going to the same state,
+    the missing transitions (-1) are left out.
+    """
+    runs: List[Tuple[int, int, int]] = []
+    for char_class, next_state in enumerate(row):
+        if next_state < 0:
+            continue
+        if runs and runs[-1][1] == char_class - 1 and runs[-1][2] == next_state:
+            runs[-1] = (runs[-1][0], char_class, next_state)
+        else:
+            runs.append((char_class, char_class, next_state))
+    return runs
+
+
+def array_bytes(*arrays: array) -> int:
+    return sum(values.itemsize * len(values) for values in arrays)
+
+
+class CombTable:
+    """
+    Row displacement: the transitions of state s on class c are at next_states[bases[s] + c]
+    iff checks[bases[s] + c] == s, the rows are placed first fit from the fullest one.
+    """
+
+    def __init__(self, table: DFATable):
+        self.start = table.start
+        self.accepting = table.accepting
+        self.class_map = table.class_map
+        self.num_states = table.num_states
+        self.num_classes = table.num_classes
+
+        rows = [
+            [(char_class, next_state) for char_class, next_state in enumerate(self.__row(table, state)) if next_state >= 0]
+            for state in range(table.num_states)
+        ]
+        self.bases = array("i", [0] * table.num_states)
+        self.next_states = array("i")
+        self.checks = array("i")
+        first_free = 0  # every slot before it is taken
+        for state in sorted(range(table.num_states), key=lambda state: -len(rows[state])):
+            entries = rows[state]
+            if not entries:
+                continue
+            base = max(0, first_free - entries[0][0])
+            while any(base + char_class < len(self.checks) and self.checks[base + char_class] >= 0 for char_class, _ in entries):
+                base += 1
+            self.bases[state] = base
+            for char_class, next_state in entries:
+                while len(self.checks) <= base + char_class:
+                    self.checks.append(-1)
+                    self.next_states.append(-1)
+                self.checks[base + char_class] = state
+                self.next_states[base + char_class] = next_state
+            while first_free < len(self.checks) and self.checks[first_free] >= 0:
+                first_free += 1
+
+    @staticmethod
+    def __row(table: DFATable, state: int) -> List[int]:
+        return table.transitions[state * table.num_classes : (state + 1) * table.num_classes]
+
+    def step(self, state: int, char_class: int) -> int:
+        index = self.bases[state] + char_class
+        if index < len(self.checks) and self.checks[index] == state:
+            return self.next_states[index]
+        return -1
+
+    def memory(self) -> int:
+        return array_bytes(self.bases, self.next_states, self.checks)
+
+
+class HybridTable:
+    """
+    Every state gets a dense row (dense[dense_rows[s] + c]) or, when it has at most
+    max_sparse_density * num_classes runs (see row_runs), its runs in the flat run arrays
+    between run_starts[s] and run_starts[s + 1], searched with bisect.
+
+    Args:
+        table: the DFATable to compress.
+        max_sparse_density: the density (runs / classes) under which a row is sparse,
+        a run costs 3 ints so under 1/3 a sparse row is smaller than a dense one.
+    """
+
+    def __init__(self, table: DFATable, max_sparse_density: float = 0.25):
+        self.start = table.start
+        self.accepting = table.accepting
+        self.class_map = table.class_map
+        self.num_states = table.num_states
+        self.num_classes = table.num_classes
+
+        self.dense_rows = array("i")  # the offset of the row in dense, or -1 for a sparse state
+        self.dense = array("i")
+        self.run_starts = array("i")
+        self.run_firsts = array("i")
+        self.run_lasts = array("i")
+        self.run_targets = array("i")
+        for state in range(table.num_states):
+            row = table.transitions[state * table.num_classes : (state + 1) * table.num_classes]
+            runs = row_runs(row)
+            self.run_starts.append(len(self.run_firsts))
+            if len(runs) <= max_sparse_density * table.num_classes:
+                self.dense_rows.append(-1)
+                for first, last, next_state in runs:
+                    self.run_firsts.append(first)
+                    self.run_lasts.append(last)
+                    self.run_targets.append(next_state)
+            else:
+                self.dense_rows.append(len(self.dense))
+                self.dense.extend(row)
+        self.run_starts.append(len(self.run_firsts))
+        self.dense_states = sum(offset >= 0 for offset in self.dense_rows)
+
+    def step(self, state: int, char_class: int) -> int:
+        offset = self.dense_rows[state]
+        if offset >= 0:
+            return self.dense[offset + char_class]
+        low = self.run_starts[state]
+        index = bisect_right(self.run_firsts, char_class, low, self.run_starts[state + 1]) - 1
+        if index >= low and char_class <= self.run_lasts[index]:
+            return self.run_targets[index]
+        return -1
+
+    def memory(self) -> int:
+        return array_bytes(
+            self.dense_rows, self.dense, self.run_starts, self.run_firsts, self.run_lasts, self.run_targets
+        )
+
+
+class CompressedDFAMatcher:
+    """
+    Runs a CombTable or a HybridTable over the input, like matcher.DFAMatcher does over a DFATable.
+    """
+
+    def __init__(self, table: CombTable | HybridTable):
+        self.table = table
+
+    def fullmatch(self, text: str) -> bool:
+        class_map = self.table.class_map
+        step = self.table.step
+        state = self.table.start
+        for char in text:
+            char_class = class_map.get(char)
+            if char_class is None:
+                return False
+            state = step(state, char_class)
+            if state < 0:
+                return False
+        return self.table.accepting[state]
+
+    def match_at(self, text: str, pos: int = 0) -> int:
+        """
+        Returns the end of the longest match starting at pos, or -1 if there's none.
+        """
+        class_map = self.table.class_map
+        step = self.table.step
+        accepting = self.table.accepting
+        state = self.table.start
+        end = pos if accepting[state] else -1
+        for index in range(pos, len(text)):
+            char_class = class_map.get(text[index])
+            if char_class is None:
+                break
+            state = step(state, char_class)
+            if state < 0:
+                break
+            if accepting[state]:
+                end = index + 1
+        return end
+
+
+def __lookup_ns(step: Callable[[int, int], int], num_states: int, num_classes: int) -> float:
+    # every (state, class) pair is looked up, as many times as needed to run for a while
+    pairs = [(state, char_class) for state in range(num_states) for char_class in range(num_classes)]
+    lookups = 0
+    started = time.perf_counter()
+    while lookups == 0 or time.perf_counter() - started < 0.05:
+        for state, char_class in pairs:
+            step(state, char_class)
+        lookups += len(pairs)
+    return (time.perf_counter() - started) / lookups * 1e9
+
+
+def layout_report(table: DFATable, max_sparse_density: float = 0.25) -> List[Dict]:
+    """
+    Returns the memory (bytes of the transition arrays as 32 bits ints, the class map is the same
+    for all of them) and the mean lookup time of every layout of the given table.
+    """
+    transitions = array("i", table.transitions)
+    num_classes = table.num_classes
+    comb = CombTable(table)
+    hybrid = HybridTable(table, max_sparse_density)
+    filled = sum(next_state >= 0 for next_state in table.transitions)
+    layouts = [
+        ("dense", array_bytes(transitions), lambda state, char_class: transitions[state * num_classes + char_class], ""),
+        ("comb", comb.memory(), comb.step, f"vector length {len(comb.checks)}"),
+        ("hybrid", hybrid.memory(), hybrid.step, f"{hybrid.dense_states} dense / {table.num_states - hybrid.dense_states} sparse states"),
+    ]
+    return [
+        {
+            "layout": name,
+            "bytes": memory,
+            "bytes_per_transition": memory / max(filled, 1),
+            "lookup_ns": __lookup_ns(step, table.num_states, table.num_classes),
+            "details": details,
+        }
+        for name, memory, step, details in layouts
+    ]
+
+
+def main():
+    args = argparse.ArgumentParser(description="compare the layouts of the transition table of a regex")
+    args.add_argument("regex", help="the regex to compile")
+    args.add_argument("--max-sparse-density", type=float, default=0.25, help="the density under which a row is sparse")
+    args = args.parse_args()
+    table = DFATable(compile_regex(args.regex, verbose=True))
+    filled = sum(next_state >= 0 for next_state in table.transitions)
+    print(f"{table.num_states} states x {table.num_classes} classes, {filled} transitions")
+    for report in layout_report(table, args.max_sparse_density):
+        print(
+            f"{report['layout']:>6}: {report['bytes']:10d} bytes ({report['bytes_per_transition']:.1f} per transition)"
+            f"  {report['lookup_ns']:7.1f} ns/lookup  {report['details']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
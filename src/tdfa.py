@@ -0,0 +1,272 @@
+# this file extracts the spans of the capture groups in a single pass without backtracking,
+# the AST (with its GroupAstNode, see Parser(..., captures=True)) is compiled into a tagged NFA
+# where every group is wrapped by an opening and a closing tag edge (epsilon edges recording the
+# position), then it's determinized into a tagged DFA (Laurikari's TDFA) whose transitions carry
+# register operations, every register holds a position and a state knows which register holds
+# every tag of each of its NFA states, so matching costs O(registers) per character at most
+#
+# the NFA edges leaving a state are ordered by priority (the left alternative first, greedy
+# repetitions), and the NFA states of a DFA state are kept in priority order, so the spans
+# are the ones of the highest priority match i.e the ones python's re.fullmatch finds,
+# including its rule for the empty iterations: a repetition goes on after an iteration unless
+# that iteration started at the current position (then it exits keeping its spans, e.g (a*)+b
+# on "aab" gives (2, 2) for the group), the first iteration of a + doesn't count as started
+
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+from lexer import Lexer
+from parser import Parser
+from asttree import (
+    AstNode,
+    OrAstNode,
+    SeqAstNode,
+    StarAstNode,
+    PlusAstNode,
+    QuestionMarkAstNode,
+    LiteralCharacterAstNode,
+    CharacterClassAstNode,
+    GroupAstNode,
+)
+from budget import CompileBudget
+
+# the kinds of the tagged NFA edges
+CHAR, EPSILON_EDGE, TAG, ENTER, REPEAT = 0, 1, 2, 3, 4
+# the source of a register operation setting the register to the current position
+POSITION = -1
+
+
+class TaggedNFA:
+    """
+    Thompson's construction keeping the capture groups as tag edges, the tags of group g
+    are 2 * (g - 1) (where it opens) and 2 * (g - 1) + 1 (where it closes), the epsilon edges
+    entering a * or a + and going back to their start are ENTER / REPEAT edges.
+
+    Attributes:
+        edges: edges[state] is the priority-ordered list of (kind, value, next_state), the value
+        is the (first, last) code points of a CHAR edge, the tag of a TAG edge, the loop (its
+        REPEAT edge's state) of a REPEAT edge, (loop, whether the first iteration counts as
+        started) for an ENTER edge or None.
+        groups: the number of capture groups.
+        start, final: the starting and the accepting states.
+    """
+
+    def __init__(self, root: AstNode):
+        self.edges: List[List[Tuple[int, object, int]]] = []
+        self.groups = 0
+        self.start, self.final = self.__build(root)
+
+    def __new_state(self) -> int:
+        self.edges.append([])
+        return len(self.edges) - 1
+
+    def __build(self, node: AstNode) -> Tuple[int, int]:
+        start = self.__new_state()
+        if node is None:
+            return start, start
+        if isinstance(node, LiteralCharacterAstNode):
+            end = self.__new_state()
+            self.edges[start].append((CHAR, (ord(node.char), ord(node.char)), end))
+            return start, end
+        if isinstance(node, CharacterClassAstNode):
+            end = self.__new_state()
+            for char in sorted(node.char_class, key=lambda char: char if isinstance(char, str) else char[0]):
+                first, last = (char, char) if isinstance(char, str) else char
+                self.edges[start].append((CHAR, (ord(first), ord(last)), end))
+            return start, end
+        if isinstance(node, GroupAstNode):
+            self.groups = max(self.groups, node.index)
+            left_start, left_end = self.__build(node.left)
+            end = self.__new_state()
+            self.edges[start].append((TAG, 2 * (node.index - 1), left_start))
+            self.edges[left_end].append((TAG, 2 * (node.index - 1) + 1, end))
+            return start, end
+        if isinstance(node, OrAstNode):
+            left_start, left_end = self.__build(node.left)
+            right_start, right_end = self.__build(node.right)
+            end = self.__new_state()
+            self.edges[start] += [(EPSILON_EDGE, None, left_start), (EPSILON_EDGE, None, right_start)]
+            self.edges[left_end].append((EPSILON_EDGE, None, end))
+            self.edges[right_end].append((EPSILON_EDGE, None, end))
+            return start, end
+        if isinstance(node, SeqAstNode):
+            left_start, left_end = self.__build(node.left)
+            right_start, right_end = self.__build(node.right)
+            self.edges[start].append((EPSILON_EDGE, None, left_start))
+            self.edges[left_end].append((EPSILON_EDGE, None, right_start))
+            return start, right_end
+        # the greedy counters try their child first
+        child_start, child_end = self.__build(node.left)
+        end = self.__new_state()
+        if isinstance(node, (StarAstNode, PlusAstNode)):
+            self.edges[start].append((ENTER, (child_end, isinstance(node, StarAstNode)), child_start))
+            self.edges[child_end].append((REPEAT, child_end, child_start))
+        else:
+            self.edges[start].append((EPSILON_EDGE, None, child_start))
+        self.edges[child_end].append((EPSILON_EDGE, None, end))
+        if isinstance(node, (StarAstNode, QuestionMarkAstNode)):
+            self.edges[start].append((EPSILON_EDGE, None, end))
+        return start, end
+
+
+# a configuration: (NFA state, the register holding every tag)
+Configuration = Tuple[int, Tuple[int, ...]]
+# the register operations of a transition: ops[register] is POSITION or the register its value is copied from
+RegisterOps = Tuple[int, ...]
+
+
+class TaggedDFA:
+    """
+    Args:
+        input_regex: the regex, every parenthesized subexpression is a capture group.
+        budget: optional limits, the TDFA states are checked against its max_dfa_states.
+
+    Attributes:
+        groups: the number of capture groups.
+        num_registers: the max number of registers a state uses, i.e the memory of a match.
+    """
+
+    def __init__(self, input_regex: str, budget: CompileBudget | None = None):
+        parser = Parser(Lexer(input_regex, budget).tokenize(), captures=True)
+        self.tnfa = TaggedNFA(parser.parse())
+        self.groups = self.tnfa.groups
+        self.num_tags = 2 * self.groups
+        self.budget = budget
+
+        # the symbol classes are the intervals between the bounds of all the CHAR edges
+        bounds = set()
+        for edges in self.tnfa.edges:
+            for kind, value, _ in edges:
+                if kind == CHAR:
+                    bounds.update((value[0], value[1] + 1))
+        self.bounds: List[int] = sorted(bounds)
+        self.class_cache: Dict[str, int] = {}
+
+        self.states: Dict[Tuple[Configuration, ...], int] = {}
+        self.configurations: List[Tuple[Configuration, ...]] = []
+        # finals[state] is the register of every tag of the match ending there, or None
+        self.finals: List[Tuple[int, ...] | None] = []
+        # transitions[state][symbol class] is (next_state, register ops or None when nothing changes) or None
+        self.transitions: List[List[Tuple[int, RegisterOps | None] | None]] = []
+        # the number of (not None) transitions so far, for the budget
+        self.num_transitions = 0
+
+        # before the input, the only register (0) holds -1 for "unset"
+        initial = self.__closure([(self.tnfa.start, (0,) * self.num_tags)])
+        self.start, self.start_ops = self.__intern(initial)
+        self.num_registers = max(len(self.start_ops), 1)
+        state = 0
+        while state < len(self.configurations):  # states are added while they're processed
+            row = []
+            for symbol_class in range(len(self.bounds) - 1):
+                row.append(self.__transition(state, self.bounds[symbol_class]))
+            self.transitions.append(row)
+            state += 1
+
+    def __closure(self, configurations: List[Configuration]) -> List[Tuple[int, Tuple[int, ...], frozenset]]:
+        # the epsilon / tag closure in priority order (a depth first search visiting the edges in
+        # their order), a path also carries the loops whose iteration started at the current position,
+        # those can't repeat again, an NFA state reached again by the same kind of path is dropped
+        # as the first path has the higher priority,
+        # returns (NFA state, registers, the tags set to the current position on the way)
+        closure = []
+        seen = set()
+        stack = [(state, registers, frozenset(), frozenset()) for state, registers in reversed(configurations)]
+        while stack:
+            state, registers, set_tags, started = stack.pop()
+            if (state, started) in seen:
+                continue
+            seen.add((state, started))
+            closure.append((state, registers, set_tags))
+            for kind, value, next_state in reversed(self.tnfa.edges[state]):
+                if kind == EPSILON_EDGE:
+                    stack.append((next_state, registers, set_tags, started))
+                elif kind == TAG:
+                    stack.append((next_state, registers, set_tags | {value}, started))
+                elif kind == ENTER:
+                    loop, counts = value
+                    stack.append((next_state, registers, set_tags, started | {loop} if counts else started - {loop}))
+                elif kind == REPEAT and value not in started:
+                    stack.append((next_state, registers, set_tags, started | {value}))
+        return closure
+
+    def __intern(self, closure: List[Tuple[int, Tuple[int, ...], frozenset]]) -> Tuple[int, RegisterOps]:
+        # the registers of the new state are numbered in order of first use, two tags holding the same value
+        # share a register, so the states equal up to a renaming of their registers are the same state
+        sources: Dict[int, int] = {}
+        ops: List[int] = []
+        configurations: List[Configuration] = []
+        final = None
+        kept = set()
+        for state, registers, set_tags in closure:
+            if state in kept or state != self.tnfa.final and not any(kind == CHAR for kind, _, _ in self.tnfa.edges[state]):
+                continue  # it can't consume anything nor accept, or a higher priority path already reached it
+            kept.add(state)
+            new_registers = []
+            for tag in range(self.num_tags):
+                source = POSITION if tag in set_tags else registers[tag]
+                if source not in sources:
+                    sources[source] = len(ops)
+                    ops.append(source)
+                new_registers.append(sources[source])
+            configurations.append((state, tuple(new_registers)))
+            if state == self.tnfa.final and final is None:
+                final = tuple(new_registers)
+        key = tuple(configurations)
+        if key not in self.states:
+            self.states[key] = len(self.configurations)
+            self.configurations.append(key)
+            self.finals.append(final)
+            if self.budget is not None:
+                self.budget.check_dfa(len(self.configurations), self.num_transitions)
+        return self.states[key], tuple(ops)
+
+    def __transition(self, state: int, code: int) -> Tuple[int, RegisterOps | None] | None:
+        moved = []
+        for nfa_state, registers in self.configurations[state]:
+            for kind, value, next_state in self.tnfa.edges[nfa_state]:
+                if kind == CHAR and value[0] <= code <= value[1]:
+                    moved.append((next_state, registers))
+        if not moved:
+            return None
+        self.num_transitions += 1
+        next_state, ops = self.__intern(self.__closure(moved))
+        self.num_registers = max(self.num_registers, len(ops))
+        if ops == tuple(range(len(ops))):
+            return next_state, None  # every register keeps its value
+        return next_state, ops
+
+    def __symbol_class(self, char: str) -> int:
+        symbol_class = self.class_cache.get(char)
+        if symbol_class is None:
+            index = bisect_right(self.bounds, ord(char)) - 1
+            symbol_class = index if 0 <= index < len(self.bounds) - 1 else -1
+            self.class_cache[char] = symbol_class
+        return symbol_class
+
+    def fullmatch(self, text: str) -> List[Tuple[int, int] | None] | None:
+        """
+        Returns None if the whole text doesn't match, else the spans of the groups like python's
+        re.fullmatch(...).span(g) for g in 0 .. groups, None for a group that didn't participate.
+        """
+        registers = [-1]
+        registers = [0 if source == POSITION else registers[source] for source in self.start_ops]
+        state = self.start
+        transitions = self.transitions
+        for index, char in enumerate(text):
+            symbol_class = self.__symbol_class(char)
+            if symbol_class < 0:
+                return None
+            transition = transitions[state][symbol_class]
+            if transition is None:
+                return None
+            state, ops = transition
+            if ops is not None:
+                registers = [index + 1 if source == POSITION else registers[source] for source in ops]
+        final = self.finals[state]
+        if final is None:
+            return None
+        spans: List[Tuple[int, int] | None] = [(0, len(text))]
+        for group in range(self.groups):
+            start, end = registers[final[2 * group]], registers[final[2 * group + 1]]
+            spans.append((start, end) if start >= 0 and end >= 0 else None)
+        return spans
@@ -0,0 +1,125 @@
+# this file rewrites an AST over unicode code points into an AST over the bytes
+# of their UTF-8 encoding, every byte b is the character chr(b) so the rest of the
+# pipeline stays the same while the alphabet has at most 256 symbols,
+# the resulting DFA runs directly over bytes, memoryviews or mmaps (see matcher.ByteDFAMatcher)
+
+from asttree import (
+    AstNode,
+    OrAstNode,
+    SeqAstNode,
+    StarAstNode,
+    PlusAstNode,
+    QuestionMarkAstNode,
+    LiteralCharacterAstNode,
+    CharacterClassAstNode,
+    GroupAstNode,
+)
+from typing import List, Tuple
+
+# the last code point encoded on 1, 2 and 3 bytes
+__ENCODING_LIMITS = (0x7F, 0x7FF, 0xFFFF)
+__SURROGATES = (0xD800, 0xDFFF)
+
+
+def utf8_sequences(first: int, last: int) -> List[List[Tuple[int, int]]]:
+    """
+    Splits the code points range [first, last] into byte ranges sequences,
+    a UTF-8 encoded code point is in the range iff its bytes match one of the sequences.
+
+    e.g [0x80, 0x10FFFF] gives [[(0xC2, 0xDF), (0x80, 0xBF)], [(0xE0, 0xE0), (0xA0, 0xBF), (0x80, 0xBF)], ...]
+    """
+    sequences: List[List[Tuple[int, int]]] = []
+    ranges = [(first, last)]
+    while ranges:
+        first, last = ranges.pop()
+        # surrogates can't be encoded, so they're just skipped
+        if first <= __SURROGATES[1] and last >= __SURROGATES[0]:
+            if last > __SURROGATES[1]:
+                ranges.append((__SURROGATES[1] + 1, last))
+            if first < __SURROGATES[0]:
+                ranges.append((first, __SURROGATES[0] - 1))
+            continue
+        # both ends must be encoded on the same number of bytes
+        split = next((limit for limit in __ENCODING_LIMITS if first <= limit < last), None)
+        if split is not None:
+            ranges.append((split + 1, last))
+            ranges.append((first, split))
+            continue
+        if last <= __ENCODING_LIMITS[0]:
+            sequences.append([(first, last)])
+            continue
+        # and every continuation byte must range over all of its values (0x80 .. 0xBF)
+        # once the leading bytes differ
+        for index in range(1, len(chr(last).encode("utf-8"))):
+            mask = (1 << (6 * index)) - 1
+            if first & ~mask != last & ~mask:
+                if first & mask != 0:
+                    ranges.append(((first | mask) + 1, last))
+                    ranges.append((first, first | mask))
+                    break
+                if last & mask != mask:
+                    ranges.append((last & ~mask, last))
+                    ranges.append((first, (last & ~mask) - 1))
+                    break
+        else:
+            sequences.append(list(zip(chr(first).encode("utf-8"), chr(last).encode("utf-8"))))
+    return sequences
+
+
+def __byte_node(first: int, last: int) -> AstNode:
+    if first == last:
+        return LiteralCharacterAstNode(chr(first))
+    return CharacterClassAstNode({(chr(first), chr(last))})
+
+
+def __sequence_node(byte_ranges: List[Tuple[int, int]]) -> AstNode:
+    node = __byte_node(*byte_ranges[0])
+    for byte_range in byte_ranges[1:]:
+        node = SeqAstNode(node, __byte_node(*byte_range))
+    return node
+
+
+def __code_point_ranges(char_class: CharacterClassAstNode) -> List[Tuple[int, int]]:
+    ranges = sorted(
+        (ord(char), ord(char)) if isinstance(char, str) else (ord(char[0]), ord(char[1]))
+        for char in char_class.char_class
+    )
+    merged: List[Tuple[int, int]] = []
+    for first, last in ranges:
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def utf8_ast(root: AstNode) -> AstNode:
+    """
+    Returns the byte level AST of the given (code points) AST.
+    """
+    if root is None:
+        return None
+    if isinstance(root, GroupAstNode):
+        return GroupAstNode(utf8_ast(root.left), root.index)
+    if isinstance(root, LiteralCharacterAstNode):
+        return __sequence_node([(byte, byte) for byte in root.char.encode("utf-8")])
+    if isinstance(root, CharacterClassAstNode):
+        alternatives = []
+        for first, last in __code_point_ranges(root):
+            alternatives.extend(__sequence_node(sequence) for sequence in utf8_sequences(first, last))
+        if not alternatives:
+            raise Exception(f"{root} has no code point that can be encoded in UTF-8")
+        node = alternatives[0]
+        for alternative in alternatives[1:]:
+            node = OrAstNode(node, alternative)
+        return node
+    if isinstance(root, OrAstNode):
+        return OrAstNode(utf8_ast(root.left), utf8_ast(root.right))
+    if isinstance(root, SeqAstNode):
+        return SeqAstNode(utf8_ast(root.left), utf8_ast(root.right))
+    if isinstance(root, StarAstNode):
+        return StarAstNode(utf8_ast(root.left))
+    if isinstance(root, PlusAstNode):
+        return PlusAstNode(utf8_ast(root.left))
+    if isinstance(root, QuestionMarkAstNode):
+        return QuestionMarkAstNode(utf8_ast(root.left))
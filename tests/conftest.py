@@ -0,0 +1,6 @@
+# the modules of src import each other by their plain names (they're run from src/),
+# so the tests put src on the path the same way
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
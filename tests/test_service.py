@@ -0,0 +1,151 @@
+import asyncio
+import os
+import tempfile
+import time
+from service import MatchService, ServiceClient
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_handle_request_ops():
+    async def scenario():
+        service = MatchService(batch_window=0.0)
+        try:
+            assert await service.handle_request({"id": 1, "op": "match", "regex": "(a|b)*c", "text": "abac"}) == {"id": 1, "match": True, "ok": True}
+            assert (await service.handle_request({"id": 2, "op": "match", "regex": "(a|b)*c", "text": "abca"}))["match"] is False
+            compiled = await service.handle_request({"id": 3, "op": "compile", "regex": "(a|b)*c"})
+            assert compiled["ok"] and compiled["cached"] and compiled["states"] == 2
+            metrics = await service.handle_request({"id": 4, "op": "metrics"})
+            assert metrics["metrics"]["cache_misses"] == 1 and metrics["metrics"]["cache_hits"] == 2
+        finally:
+            service.close()
+
+    run(scenario())
+
+
+def test_handle_request_errors():
+    async def scenario():
+        service = MatchService()
+        try:
+            missing = await service.handle_request({"id": 1, "op": "match", "regex": "a"})
+            assert missing == {"id": 1, "ok": False, "error": "missing field 'text'"}
+            unknown = await service.handle_request({"id": 2, "op": "nope"})
+            assert not unknown["ok"] and "unknown op" in unknown["error"]
+            invalid = await service.handle_request({"id": 3, "op": "match", "regex": "(a", "text": "a"})
+            assert not invalid["ok"]
+            assert service.metrics()["errors"] == 3
+        finally:
+            service.close()
+
+    run(scenario())
+
+
+def test_batches_concurrent_matches():
+    async def scenario():
+        service = MatchService(batch_window=0.05)
+        try:
+            texts = ["ab" * i for i in range(50)] + ["abc"]
+            results = await asyncio.gather(*(service.match("(ab)*", text) for text in texts))
+            assert results == [True] * 50 + [False]
+            assert service.metrics()["batches"] <= 2
+        finally:
+            service.close()
+
+    run(scenario())
+
+
+def test_big_batch_does_not_block_the_loop():
+    async def scenario():
+        service = MatchService(batch_window=0.0)
+        try:
+            await service.compile("(a|b)*")
+            big = asyncio.ensure_future(service.match("(a|b)*", "ab" * 2_000_000))
+            await asyncio.sleep(0.01)  # the batch is running on the matcher thread
+            started = time.perf_counter()
+            await service.handle_request({"id": 1, "op": "metrics"})
+            waited = time.perf_counter() - started
+            assert not big.done()
+            assert await big
+            assert waited < 0.5
+        finally:
+            service.close()
+
+    run(scenario())
+
+
+def test_unix_socket_round_trip():
+    async def scenario(path):
+        service = MatchService()
+        server = await service.serve_unix(path)
+        try:
+            client = await ServiceClient.connect_unix(path)
+            assert await asyncio.gather(client.match("[a-z]+", "abc"), client.match("[a-z]+", "ab1")) == [True, False]
+            response = await client.request("compile", regex="[a-z]+")
+            assert response["ok"] and response["cached"]
+            await client.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(scenario(os.path.join(directory, "service.sock")))
+
+
+def test_too_long_line_closes_the_connection_cleanly():
+    async def scenario(path):
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        service = MatchService(batch_window=0.1)
+        server = await asyncio.start_unix_server(service.handle_connection, path, limit=256)
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b'{"id": 1, "op": "match", "regex": "a*", "text": "aaa"}\n')
+            writer.write(b'{"id": 2, "op": "match", "regex": "a*", "text": "' + b"a" * 1024 + b'"}\n')
+            await writer.drain()
+            assert await reader.read() == b""  # closed by the service
+            writer.close()
+            await asyncio.sleep(0.2)  # the batch window of the cancelled request ends
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+        assert errors == []
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(scenario(os.path.join(directory, "service.sock")))
+
+
+def test_client_fails_pending_requests_when_the_connection_is_lost():
+    async def scenario(path):
+        received = []
+
+        async def silent(reader, writer):
+            # reads two requests without answering them, then hangs up
+            received.append(await reader.readline())
+            received.append(await reader.readline())
+            writer.close()
+
+        server = await asyncio.start_unix_server(silent, path)
+        try:
+            client = await ServiceClient.connect_unix(path)
+            try:
+                await asyncio.wait_for(client.request("metrics"), 0.05)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await client.request("metrics")
+                raise AssertionError("the request should fail")
+            except ConnectionError:
+                pass
+            await client.receiver  # ended without an InvalidStateError
+            assert client.pending == {} and len(received) == 2
+            await client.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(scenario(os.path.join(directory, "service.sock")))
@@ -0,0 +1,54 @@
+import random
+import re
+import pytest
+from tdfa import TaggedDFA
+from budget import CompileBudget, BudgetExceededError
+from bench_matching import to_python_regex
+
+
+def re_spans(regex: str, text: str):
+    match = re.fullmatch(to_python_regex(regex), text)
+    if match is None:
+        return None
+    return [match.span(group) if match.group(group) is not None else None for group in range(match.re.groups + 1)]
+
+
+@pytest.mark.parametrize(
+    "regex, text, spans",
+    [
+        ("((a|b)*)(abb)", "ababb", [(0, 5), (0, 2), (1, 2), (2, 5)]),
+        ("(x)?y", "y", [(0, 1), None]),
+        ("(a|ab)(c|bcd)(d*)", "abcd", [(0, 4), (0, 1), (1, 4), (4, 4)]),
+        # the repetitions whose body can match empty take one last empty iteration like re does
+        ("((c?)+)", "c", [(0, 1), (0, 1), (1, 1)]),
+        ("((b|(c?))+)", "b", [(0, 1), (0, 1), (1, 1), (1, 1)]),
+        ("(a*)+b", "aab", [(0, 3), (2, 2)]),
+        ("(a*)*", "aa", [(0, 2), (2, 2)]),
+        ("(a*)*", "", [(0, 0), (0, 0)]),
+    ],
+)
+def test_spans(regex, text, spans):
+    assert TaggedDFA(regex).fullmatch(text) == spans
+    assert re_spans(regex, text) == spans
+
+
+def test_budget_counts_the_transitions():
+    tdfa = TaggedDFA("((a|b)*)(abb)", CompileBudget())
+    assert tdfa.num_transitions == sum(transition is not None for row in tdfa.transitions for transition in row)
+    with pytest.raises(BudgetExceededError):
+        TaggedDFA("((a|b)*)(abb)", CompileBudget(max_transitions=3))
+
+
+def test_no_match():
+    tdfa = TaggedDFA("(a|b)*c")
+    assert tdfa.fullmatch("abab") is None
+    assert tdfa.fullmatch("abxc") is None
+
+
+@pytest.mark.parametrize("regex", ["((a)|b)*", "(a+|b)*c", "((a*)b)*", "(a?)(a?)a", "((a|(b?))+)(c*)", "((a*)|(b))*", "(([ab]?)+)?c"])
+def test_agrees_with_re(regex):
+    tdfa = TaggedDFA(regex)
+    rng = random.Random(regex)
+    for _ in range(500):
+        text = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+        assert tdfa.fullmatch(text) == re_spans(regex, text), text